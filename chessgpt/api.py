@@ -1,16 +1,23 @@
+from . import batching, conditional, events, gamelog, greetings, tasks, timeline
+from .archive import game_history, game_messages, game_moves
+from .governor import governor, PRIORITY_CHAT
 from .models import Game, Move, ChatHistory
+from .search import search_chat
 from asgiref.sync import sync_to_async
+from datetime import datetime
 from django.contrib.auth.models import User
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from ninja import ModelSchema, Schema, NinjaAPI
 from typing import List
 
+import asyncio
 import chess
 import chess.pgn
 import io
-import openai
 
 api = NinjaAPI(title="ChessGPT API", description="API for ChessGPT.", version="0.1.0")
 
@@ -54,22 +61,47 @@ class ErrorSchema(Schema):
     error: str = "Error"
 
 
+class ChatSearchResultSchema(Schema):
+    id: int
+    game_id: int
+    role: str
+    snippet: str
+    rank: float
+    created: datetime
+
+
+class ChatSearchSchema(Schema):
+    page: int
+    page_size: int
+    has_more: bool
+    results: List[ChatSearchResultSchema]
+
+
+class SuggestionSchema(Schema):
+    ply: int
+    status: str = "pending"
+    move: str = None
+    error: str = None
+
+
+def _render_json(request, data) -> conditional.Rendered:
+    """Serializes schemas the way Ninja would, for responses that are cached."""
+    if isinstance(data, list):
+        data = [item.dict() for item in data]
+    else:
+        data = data.dict()
+    return api.renderer.render(request, data, response_status=200).encode(), api.get_content_type()
+
+
 @api.get("/hello", tags=["hello"], response={200: str}, summary="Hello world!")
 async def hello_world(request):
-    completion = await openai.ChatCompletion.acreate(
-        model="gpt-3.5-turbo-0613",
-        temperature=0.8,
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a jocular chess player looking for an opponent.",
-            },
-            {"role": "user", "content": "Hello!"},
-        ],
-    )
+    return await greetings.pool.get()
+
 
-    content = completion.choices[0].message.content
-    return content
+@api.get("/metrics/openai", tags=["metrics"], summary="OpenAI throttling metrics.")
+def get_openai_metrics(request):
+    """Queue times and rate limiting of outbound OpenAI calls."""
+    return governor.metrics()
 
 
 @api.get(
@@ -89,7 +121,9 @@ def get_chess_games(request):
     response={200: GameModelSchema, 400: ErrorSchema, 500: str},
     summary="Create a new chess game.",
 )
-async def post_chess_game(request, payload: GameRequestModel, event: str = None):
+async def post_chess_game(
+    request, payload: GameRequestModel, event: str = None, prefetch: bool = True
+):
     # From query params.
     if event:
         payload.event = event
@@ -115,6 +149,10 @@ async def post_chess_game(request, payload: GameRequestModel, event: str = None)
             game=game, role="user", content="White, what's your opening move?"
         )
 
+        ## Start thinking about the opening move before the client asks for it.
+        if prefetch:
+            tasks.queue.submit("suggest", game.id, chess.Board(game.fen).ply())
+
         return game
 
     except Exception as e:
@@ -129,8 +167,14 @@ async def post_chess_game(request, payload: GameRequestModel, event: str = None)
 )
 def get_chess_game(request, game_id):
     """Get a chess game by ID."""
-    game = get_object_or_404(Game, id=game_id)
-    return game
+    game = gamelog.get_game(game_id)
+    return conditional.respond(
+        request,
+        f"game:{game.id}",
+        conditional.game_etag(game, "game"),
+        game.modified.timestamp(),
+        lambda: _render_json(request, GameModelSchema.from_orm(game)),
+    )
 
 
 @api.get(
@@ -140,30 +184,47 @@ def get_chess_game(request, game_id):
 )
 async def get_chess_game_pgn(request, game_id: int) -> HttpResponse:
     """Get a chess game by ID."""
-    game = await sync_to_async(get_object_or_404)(Game, id=game_id)
-
-    chessGame = chess.pgn.read_game(io.StringIO(game.pgn))
-    chessGame.headers = chess.pgn.Headers(
-        [
-            ("Event", game.event),
-            ("Date", game.date.strftime("%Y.%m.%d")),
-            ("White", game.white),
-            ("Black", game.black),
-            ("Round", game.round),
-            ("Result", game.outcome),
-        ]
+    game = await gamelog.aget_game(game_id)
+
+    def render():
+        chessGame = chess.pgn.read_game(io.StringIO(game.pgn))
+        chessGame.headers = chess.pgn.Headers(
+            [
+                ("Event", game.event),
+                ("Date", game.date.strftime("%Y.%m.%d")),
+                ("White", game.white),
+                ("Black", game.black),
+                ("Round", game.round),
+                ("Result", game.outcome),
+            ]
+        )
+        return str(chessGame).encode(), "text/plain"
+
+    return conditional.respond(
+        request,
+        f"pgn:{game.id}",
+        conditional.game_etag(game, "pgn"),
+        game.modified.timestamp(),
+        render,
     )
-    return HttpResponse(str(chessGame), content_type="text/plain")
 
 
 @api.post(
     "/chess/{game_id}/move/{move}",
     tags=["moves"],
-    response={200: MoveModelSchema, 400: ErrorSchema},
+    response={200: MoveModelSchema, 400: ErrorSchema, 409: ErrorSchema},
     summary="Make a move in a chess game.",
 )
-async def post_chess_next_move(request, game_id: int, move: str):
-    game = await sync_to_async(get_object_or_404)(Game, id=game_id)
+async def post_chess_next_move(
+    request, game_id: int, move: str, ply: int = None, prefetch: bool = True
+):
+    """Make a move. Send `ply` or an If-Match ETag to make sure the game hasn't moved on."""
+    game = await gamelog.aget_game(game_id)
+
+    conflict = _check_preconditions(request, game, ply)
+    if conflict:
+        return 409, {"error": conflict}
+
     # url = request.build_absolute_uri(f"/api/chess/{game_id}/next")
     # return requests.post(url).json()
     chessBoard = chess.Board(game.fen)
@@ -194,10 +255,6 @@ async def post_chess_next_move(request, game_id: int, move: str):
     except Exception as e1:
         return 400, {"error": str(e1)}
 
-    await ChatHistory.objects.acreate(
-        game=game, role="user", content=f"{player} plays {chessMove.uci()}"
-    )
-
     content: str = ""
     if chessBoard.is_checkmate():
         game.outcome = "1-0" if turn else "0-1"
@@ -221,32 +278,90 @@ async def post_chess_next_move(request, game_id: int, move: str):
         game.outcome = "1/2-1/2"
         content = f"Game over! {player} draws by {game.outcome}."
 
-    try:
-        ## I want save the current PGN state, but I'm getting errors.
-        ## It's possible to construct the PGN from Move objects, but
-        ## I haven't done it yet.
-        chessGame = chess.pgn.read_game(io.StringIO(game.pgn))
-        chessGame.end().add_main_variation(move)
-        game.pgn = chessGame.accept(exporter)
-    except Exception as e:
-        ## TODO: Fix this error!
-        pass
-
     game.fen = chessBoard.fen()
-    await game.asave()
-
-    moveObj = await Move.objects.acreate(
-        game=game,
-        outcome=content,
-        uci=move,
-        san=san,
-        ply=chessBoard.ply() - 1,
-        fen=game.fen,
-    )
+    conflict = {"error": "The game was changed by another move. Reload and try again."}
+
+    if gamelog.enabled():
+        ## A single insert; the game row catches up in the background.
+        moveObj = await gamelog.append_move(
+            game, chessMove.uci(), san, game.fen, chessBoard.ply() - 1, content
+        )
+        if moveObj is None:
+            return 409, conflict
+        timeline.invalidate(game.id)
+    else:
+        try:
+            ## I want save the current PGN state, but I'm getting errors.
+            ## It's possible to construct the PGN from Move objects, but
+            ## I haven't done it yet.
+            chessGame = chess.pgn.read_game(io.StringIO(game.pgn))
+            chessGame.end().add_main_variation(move)
+            game.pgn = chessGame.accept(exporter)
+        except Exception as e:
+            ## TODO: Fix this error!
+            pass
+
+        ## Compare-and-swap: only one of several concurrent moves can win.
+        updated = await Game.objects.filter(id=game.id, version=game.version).aupdate(
+            fen=game.fen,
+            pgn=game.pgn,
+            outcome=game.outcome,
+            version=F("version") + 1,
+            modified=timezone.now(),
+        )
+        if not updated:
+            return 409, conflict
+        timeline.invalidate(game.id)
+
+        await ChatHistory.objects.acreate(
+            game=game, role="user", content=f"{player} plays {chessMove.uci()}"
+        )
+
+        moveObj = await Move.objects.acreate(
+            game=game,
+            outcome=content,
+            uci=chessMove.uci(),
+            san=san,
+            ply=chessBoard.ply() - 1,
+            fen=game.fen,
+        )
+
+    events.hub.publish(game.id, "move", MoveModelSchema.from_orm(moveObj).dict())
+    if content:
+        events.hub.publish(
+            game.id, "outcome", {"outcome": game.outcome, "message": content}
+        )
+
+    ## If this wasn't the suggested move, it was the player's move, so start
+    ## generating the reply while the client is still busy with this response.
+    if prefetch and not content and not _is_suggested(game.id, moveObj):
+        tasks.queue.submit("suggest", game.id, chessBoard.ply())
 
     return moveObj
 
 
+def _check_preconditions(request, game: Game, ply: int = None) -> str:
+    """Returns an error if the client's expected ply or If-Match ETag is out of date."""
+    if ply is not None and ply != chess.Board(game.fen).ply():
+        return f"Expected ply {ply}, but the game is at ply {chess.Board(game.fen).ply()}."
+
+    if_match = request.headers.get("If-Match")
+    if if_match and if_match.strip() != "*":
+        etags = [etag.strip().removeprefix("W/") for etag in if_match.split(",")]
+        if conditional.game_etag(game, "game") not in etags:
+            return "The game has changed since it was fetched."
+
+    return None
+
+
+def _is_suggested(game_id: int, move: Move) -> bool:
+    """Returns True if the move is the one the queue suggested for that ply."""
+    future = tasks.queue.get("suggest", game_id, move.ply)
+    if future is None or not future.done() or future.exception():
+        return False
+    return (future.result() or "").strip() == move.uci
+
+
 @api.get(
     "/chess/{game_id}/move",
     tags=["moves"],
@@ -254,9 +369,59 @@ async def post_chess_next_move(request, game_id: int, move: str):
     summary="Get a list of moves in a chess game.",
 )
 def get_chess_game_moves(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
-    moves = Move.objects.filter(game=game)
-    return moves
+    game = gamelog.get_game(game_id)
+    return conditional.respond(
+        request,
+        f"moves:{game.id}",
+        conditional.game_etag(game, "moves"),
+        game.modified.timestamp(),
+        lambda: _render_json(
+            request, [MoveModelSchema.from_orm(m) for m in game_moves(game)]
+        ),
+    )
+
+
+@api.get(
+    "/chess/{game_id}/events",
+    tags=["events"],
+    response={501: ErrorSchema},
+    summary="Stream game events (Server-Sent Events).",
+)
+async def get_chess_game_events(request, game_id: int):
+    """Push move, ai-move, chat and outcome events as they happen."""
+    if not isinstance(request, ASGIRequest):
+        return 501, {"error": "Event streams need an ASGI server."}
+
+    game = await gamelog.aget_game(game_id)
+    subscription = events.hub.subscribe(game.id)
+
+    ## Catch up on a suggestion that finished before the client connected.
+    ply = chess.Board(game.fen).ply()
+    future = tasks.queue.get("suggest", game.id, ply)
+    if future is not None and future.done() and not future.exception() and future.result():
+        subscription.put(events.encode("ai-move", {"ply": ply, "move": future.result()}))
+
+    response = StreamingHttpResponse(
+        events.hub.stream(subscription), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@api.get(
+    "/chess/{game_id}/timeline",
+    tags=["moves"],
+    summary="Get every position of a game as NDJSON or packed binary.",
+)
+def get_chess_game_timeline(request, game_id: int) -> HttpResponse:
+    """Positions after each move, in the format chosen by the Accept header."""
+    game = gamelog.get_game(game_id)
+    content_type = timeline.negotiate(request.headers.get("Accept"))
+    body = timeline.render(
+        game.id, game.modified.isoformat(), content_type, lambda: game_moves(game)
+    )
+    return HttpResponse(body, content_type=content_type)
 
 
 @api.get(
@@ -266,8 +431,21 @@ def get_chess_game_moves(request, game_id):
     summary="Get chat history.",
 )
 def get_chat_history(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
-    return ChatHistory.objects.filter(game=game)
+    game = gamelog.get_game(game_id)
+
+    ## Chat doesn't update the game, so the latest message is part of the ETag.
+    latest = ChatHistory.objects.filter(game=game).order_by("-id").first()
+    last_modified = max(game.modified, latest.created) if latest else game.modified
+
+    return conditional.respond(
+        request,
+        f"history:{game.id}",
+        conditional.game_etag(game, "history", latest.id if latest else 0),
+        last_modified.timestamp(),
+        lambda: _render_json(
+            request, [ChatHistoryModelSchema.from_orm(c) for c in game_history(game)]
+        ),
+    )
 
 
 @api.post(
@@ -278,7 +456,30 @@ def get_chat_history(request, game_id):
 )
 def post_chat_history(request, game_id, payload: ChatHistoryModelSchema):
     game = get_object_or_404(Game, id=game_id)
-    return ChatHistory.objects.create(game=game, **payload.dict())
+    chat = ChatHistory.objects.create(game=game, **payload.dict())
+    events.hub.publish(game.id, "chat", chat.toMessage())
+    return chat
+
+
+@api.get(
+    "/chat/search",
+    tags=["chat"],
+    response=ChatSearchSchema,
+    summary="Search the chat history of all games.",
+)
+def get_chat_search(request, q: str, page: int = 1, page_size: int = 20):
+    """Ranked full-text search. Matched words are marked with [brackets]."""
+    page = max(1, page)
+    page_size = max(1, min(page_size, 100))
+
+    ## Fetch one extra row to know whether there is another page.
+    results = search_chat(q, offset=(page - 1) * page_size, limit=page_size + 1)
+    return {
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(results) > page_size,
+        "results": results[:page_size],
+    }
 
 
 @api.get(
@@ -286,10 +487,9 @@ def post_chat_history(request, game_id, payload: ChatHistoryModelSchema):
     tags=["chat"],
     summary="Chat in real-time.",
 )
-def get_chat(request, game_id: int, message: str) -> HttpResponse:
-    game = get_object_or_404(Game, id=game_id)
-    hist = ChatHistory.objects.filter(game=game)
-    msgs = [x.toMessage() for x in hist]
+async def get_chat(request, game_id: int, message: str) -> HttpResponse:
+    game = await gamelog.aget_game(game_id)
+    msgs = await sync_to_async(game_messages)(game)
 
     msgs.append(
         {
@@ -300,43 +500,103 @@ def get_chat(request, game_id: int, message: str) -> HttpResponse:
 
     msgs.append({"role": "user", "content": message})
 
-    completion = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo-0613", temperature=0.8, messages=msgs
+    completion = await governor.chat_completion(
+        PRIORITY_CHAT, model="gpt-3.5-turbo-0613", temperature=0.8, messages=msgs
     )
 
     reply = completion.choices[0].message.content
 
-    ChatHistory.objects.create(game=game, role="user", content=message)
-    ChatHistory.objects.create(game=game, role="assistant", content=reply)
+    for chat in [
+        await ChatHistory.objects.acreate(game=game, role="user", content=message),
+        await ChatHistory.objects.acreate(game=game, role="assistant", content=reply),
+    ]:
+        events.hub.publish(game.id, "chat", chat.toMessage())
+
     return HttpResponse(reply, content_type="text/plain")
 
 
 @api.get("/chat/{game_id}/suggest", tags=["chat"], summary="Suggest the next move.")
-def post_chess_next(request, game_id):
+async def post_chess_next(request, game_id: int):
     """Suggest the next move in a chess game."""
-    game = get_object_or_404(Game, id=game_id)
-    hist = ChatHistory.objects.filter(game=game)
-    msgs = [x.toMessage() for x in hist]
+    game = await gamelog.aget_game(game_id)
 
-    msgs.append(
-        {
-            "role": "system",
-            "content": "Respond with next move in UCI format, e.g. 'e2e4' or 'e7e8q'. No other text is allowed.",
-        }
-    )
+    ## Reuse the suggestion if it was already queued after the last move.
+    future = tasks.queue.submit("suggest", game.id, chess.Board(game.fen).ply())
+    return await asyncio.wrap_future(future) or ""
 
-    ## A few more messages to help GPT-3 understand the context.
-    msgs.append({"role": "assistant", "content": "FEN: " + game.fen})
-    msgs.append({"role": "assistant", "content": "PGN: " + game.pgn})
 
-    legal_moves = [x.uci() for x in chess.Board(game.fen).legal_moves]
-    msgs.append({"role": "user", "content": "Choose one: " + str(legal_moves)})
+@api.post(
+    "/chess/{game_id}/suggestion",
+    tags=["moves"],
+    response={200: SuggestionSchema, 202: SuggestionSchema},
+    summary="Queue a suggestion for the next move.",
+)
+async def post_chess_suggestion(request, game_id: int):
+    """Queue a suggestion for the current position, if not already queued."""
+    game = await gamelog.aget_game(game_id)
+    ply = chess.Board(game.fen).ply()
+    future = tasks.queue.submit("suggest", game.id, ply)
+    return _suggestion_response(ply, future)
 
-    completion = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo-0613",
-        temperature=0.6,
-        messages=msgs,
-    )
 
-    message = completion.choices[0].message
-    return message.content
+@api.get(
+    "/chess/{game_id}/suggestion",
+    tags=["moves"],
+    response={200: SuggestionSchema, 202: SuggestionSchema, 404: ErrorSchema},
+    summary="Poll for a suggested move.",
+)
+async def get_chess_suggestion(request, game_id: int, ply: int = None, wait: float = 0):
+    """Get a queued suggestion, optionally waiting up to `wait` seconds for it."""
+    if ply is None:
+        game = await gamelog.aget_game(game_id)
+        ply = chess.Board(game.fen).ply()
+
+    future = await tasks.queue.lookup("suggest", game_id, ply)
+    if future is None:
+        return 404, {"error": f"No suggestion queued for ply {ply}."}
+
+    if wait > 0 and not future.done():
+        await _wait_for_task(future, wait)
+
+    return _suggestion_response(ply, future)
+
+
+async def _wait_for_task(future, timeout: float) -> None:
+    """Waits up to `timeout` seconds for a task. A failure stays on the future."""
+    loop = asyncio.get_running_loop()
+    finished = asyncio.Event()
+
+    def wake(_):
+        try:
+            loop.call_soon_threadsafe(finished.set)
+        except RuntimeError:
+            pass  ## Loop is closed; the request is gone.
+
+    future.add_done_callback(wake)
+    try:
+        await asyncio.wait_for(finished.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass  ## Still pending; the response says so.
+
+
+def _suggestion_response(ply: int, future):
+    if not future.done():
+        return 202, {"ply": ply, "status": "pending"}
+    if future.exception():
+        return 200, {"ply": ply, "status": "failed", "error": str(future.exception())}
+    return 200, {"ply": ply, "status": "done", "move": future.result()}
+
+
+@tasks.queue.handler("suggest")
+async def suggest_next_move(game_id: int, ply: int) -> str:
+    """Ask OpenAI for the next move in the given position."""
+    game = await gamelog.aget_game(game_id)
+    board = chess.Board(game.fen)
+    if board.ply() != ply:
+        return None  ## Someone moved while the task was waiting.
+
+    history = [move["san"] for move in await sync_to_async(game_moves)(game)]
+    move = await batching.batcher.suggest(board, history)
+
+    events.hub.publish(game_id, "ai-move", {"ply": ply, "move": move})
+    return move
@@ -0,0 +1,153 @@
+"""
+Cold storage for finished games.
+
+Once a game has an outcome, its moves and chat history are packed into one
+compressed `GameArchive` row and the hot `Move`, `ChatHistory` and `Task` rows
+are deleted. `game_moves` and `game_history` read from either place (and
+from the event log, see gamelog.py), so the endpoints don't need to know
+where a game is stored.
+
+zstd is used when the `zstandard` package is installed, otherwise zlib.
+"""
+
+import json
+import threading
+import zlib
+
+from collections import OrderedDict
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from typing import List, Optional
+
+from . import gamelog, search
+from .models import ChatHistory, Game, GameArchive, GameEvent, Move, Task
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+UNFINISHED = ["", "*"]
+
+MOVE_FIELDS = ["id", "game_id", "outcome", "ply", "uci", "san", "fen"]
+CHAT_FIELDS = ["id", "role", "content", "created"]
+
+## Decompressed archives kept in memory.
+CACHE_SIZE = 128
+_cache: "OrderedDict[int, dict]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def is_finished(game: Game) -> bool:
+    return game.outcome not in UNFINISHED and game.outcome is not None
+
+
+def finished_games():
+    """Finished games that still have hot rows."""
+    return (
+        Game.objects.exclude(outcome__isnull=True)
+        .exclude(outcome__in=UNFINISHED)
+        .filter(gamearchive__isnull=True)
+    )
+
+
+def compress(data: bytes) -> tuple:
+    """Returns (codec, blob)."""
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Install zstandard to read this archive.")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+def archive_game(game: Game) -> GameArchive:
+    """Packs a finished game into a GameArchive row and deletes its hot rows."""
+    if not is_finished(game):
+        raise ValueError(f"Game {game.id} isn't finished.")
+
+    with transaction.atomic():
+        moves = _hot_moves(game)
+        chats = _by_created(
+            list(ChatHistory.objects.filter(game=game).order_by("id").values(*CHAT_FIELDS))
+            + gamelog.logged_chats(game)
+        )
+
+        data = json.dumps({"moves": moves, "chats": chats}, cls=DjangoJSONEncoder)
+        codec, blob = compress(data.encode())
+
+        archive = GameArchive.objects.create(
+            game=game, codec=codec, blob=blob, moves=len(moves), chats=len(chats)
+        )
+        search.index_archived(game.id, chats)
+
+        Move.objects.filter(game=game).delete()
+        ChatHistory.objects.filter(game=game).delete()
+        Task.objects.filter(game=game).delete()
+        GameEvent.objects.filter(game=game).delete()
+
+    return archive
+
+
+def load_archive(game_id: int) -> Optional[dict]:
+    """Decompressed archive of a game, or None. Archives never change, so they are cached."""
+    with _lock:
+        if game_id in _cache:
+            _cache.move_to_end(game_id)
+            return _cache[game_id]
+
+    archive = GameArchive.objects.filter(game_id=game_id).first()
+    if archive is None:
+        return None
+    data = json.loads(decompress(archive.codec, bytes(archive.blob)))
+
+    with _lock:
+        _cache[game_id] = data
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return data
+
+
+def game_moves(game: Game) -> List[dict]:
+    """Moves of a game as dicts, from the hot table or the archive."""
+    archived = load_archive(game.id) if is_finished(game) else None
+    moves = archived["moves"] if archived is not None else _hot_moves(game)
+    return [dict(move, game=game.id) for move in moves]
+
+
+def game_history(game: Game) -> List:
+    """Chat history of a game. Messages added after archiving are still hot."""
+    hot = list(ChatHistory.objects.filter(game=game).order_by("id"))
+    logged = gamelog.logged_chats(game)
+    if logged:
+        hot = _by_created(hot + logged)
+    archived = load_archive(game.id) if is_finished(game) else None
+    return (archived["chats"] if archived is not None else []) + hot
+
+
+def game_messages(game: Game) -> List[dict]:
+    """Chat history as OpenAI chat messages."""
+    return [
+        {"role": _field(chat, "role"), "content": _field(chat, "content")}
+        for chat in game_history(game)
+    ]
+
+
+def _hot_moves(game: Game) -> List[dict]:
+    moves = list(Move.objects.filter(game=game).order_by("ply").values(*MOVE_FIELDS))
+    ## Moves made after the log was turned on or off are in the other place.
+    return sorted(moves + gamelog.logged_moves(game), key=lambda move: move["ply"])
+
+
+def _by_created(chats: list) -> list:
+    return sorted(chats, key=lambda chat: _field(chat, "created"))
+
+
+def _field(chat, name: str):
+    ## Chat history mixes ChatHistory rows with dicts from archives and the log.
+    return chat[name] if isinstance(chat, dict) else getattr(chat, name)
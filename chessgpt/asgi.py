@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chessgpt.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from chessgpt import events, greetings
+
+## End event streams when their client disconnects (see events.py).
+application = events.cancel_on_disconnect(django_application)
+
+## Fill the greeting pool now, so the first /hello doesn't wait on OpenAI.
+## Done here rather than in AppConfig.ready(), which management commands run too.
+greetings.pool.refill()
@@ -0,0 +1,167 @@
+"""
+Micro-batching of AI move requests across games.
+
+Suggestions that arrive within SUGGEST_BATCH_WINDOW seconds of each other are
+sent to OpenAI as one multi-position request (at most SUGGEST_BATCH_SIZE
+positions), and the JSON reply is split back to each waiting game. A move
+that is missing or illegal in its position falls back to a request of its
+own, as does the whole batch if the reply can't be parsed. A batch size of 1
+turns batching off.
+
+Either way, each prompt offers only the SUGGEST_CANDIDATES best moves by the
+static evaluator, and replies are resolved to a legal move by it too.
+
+The batcher runs on the task queue loop, where the "suggest" handler runs, so
+TASK_WORKERS should be at least SUGGEST_BATCH_SIZE for batches to fill up.
+"""
+
+import asyncio
+import chess
+import logging
+
+from django.conf import settings
+from typing import List, Optional
+
+from . import evaluator
+from .governor import governor, PRIORITY_MOVE
+from .prompts import build_batch_prompt, build_move_prompt, parse_batch_reply
+
+LOG = logging.getLogger(__name__)
+
+MODEL = "gpt-3.5-turbo-0613"
+TEMPERATURE = 0.6
+
+## Reply tokens reserved per position in a batch.
+TOKENS_PER_MOVE = 12
+
+
+async def suggest_one(board: chess.Board, history: List[str]) -> str:
+    """Ask OpenAI for the next move in one position."""
+    prompt = build_move_prompt(board, history, candidates(board))
+    LOG.debug(f"Move prompt at ply {board.ply()}: {prompt.tokens} tokens")
+
+    completion = await governor.chat_completion(
+        PRIORITY_MOVE,
+        model=MODEL,
+        temperature=TEMPERATURE,
+        messages=prompt.messages,
+    )
+    reply = completion.choices[0].message.content
+
+    move = evaluator.resolve(board, reply)
+    if move is None and evaluator.available():
+        ## Rather than another round trip, play the evaluator's best move.
+        ## A finished game has none, so the reply is passed on as it is.
+        ranked = evaluator.rank_moves(board)
+        if ranked:
+            LOG.info(f"Unusable move reply {reply!r} at ply {board.ply()}")
+            move = ranked[0][0]
+    return move.uci() if move is not None else reply
+
+
+def candidates(board: chess.Board) -> Optional[List[chess.Move]]:
+    """The moves to offer, or None (the prompt's default) if there are none."""
+    return evaluator.top_moves(board, settings.SUGGEST_CANDIDATES) or None
+
+
+class MoveRequest:
+    def __init__(self, board: chess.Board, history: List[str]):
+        self.board = board
+        self.history = history
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class SuggestBatcher:
+    """Collects concurrent move requests into batches."""
+
+    def __init__(self, size: int = 1, window: float = 0.05):
+        self.size = size
+        self.window = window
+        self._pending: List[MoveRequest] = []
+        self._timer: asyncio.TimerHandle = None
+
+    async def suggest(self, board: chess.Board, history: List[str]) -> str:
+        """The next move in the position, possibly answered as part of a batch."""
+        if self.size <= 1:
+            return await suggest_one(board, history)
+
+        request = MoveRequest(board, history)
+        self._pending.append(request)
+        if len(self._pending) >= self.size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await request.future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: List[MoveRequest]):
+        error = None
+        try:
+            await self._answer(batch)
+        except Exception as e:
+            LOG.error(f"Batch of {len(batch)} moves failed: {e}")
+            error = e
+        finally:
+            ## Never leave a caller waiting, even if the batch was cancelled.
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(error or RuntimeError("Batch was cancelled."))
+
+    async def _answer(self, batch: List[MoveRequest]):
+        ## Callers that gave up have cancelled their futures.
+        batch = [request for request in batch if not request.future.done()]
+        if len(batch) <= 1:
+            await self._fallback(batch)
+            return
+
+        prompt = build_batch_prompt([(r.board, r.history, candidates(r.board)) for r in batch])
+        LOG.debug(f"Batch prompt for {len(batch)} positions: {prompt.tokens} tokens")
+        try:
+            completion = await governor.chat_completion(
+                PRIORITY_MOVE,
+                model=MODEL,
+                temperature=TEMPERATURE,
+                max_tokens=TOKENS_PER_MOVE * len(batch),
+                messages=prompt.messages,
+            )
+            moves = parse_batch_reply(completion.choices[0].message.content)
+        except Exception as e:
+            LOG.warning(f"Batch of {len(batch)} moves failed, asking one by one: {e}")
+            await self._fallback(batch)
+            return
+
+        retry = []
+        for n, request in enumerate(batch, 1):
+            if request.future.done():
+                continue
+            move = evaluator.resolve(request.board, moves.get(n))
+            if move is not None:
+                request.future.set_result(move.uci())
+            else:
+                retry.append(request)
+
+        if retry:
+            LOG.info(f"{len(retry)} of {len(batch)} batched moves were illegal or missing")
+            await self._fallback(retry)
+
+    async def _fallback(self, batch: List[MoveRequest]):
+        async def one(request: MoveRequest):
+            try:
+                move = await suggest_one(request.board, request.history)
+            except Exception as e:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            else:
+                if not request.future.done():
+                    request.future.set_result(move)
+
+        await asyncio.gather(*(one(request) for request in batch))
+
+batcher = SuggestBatcher(size=settings.SUGGEST_BATCH_SIZE, window=settings.SUGGEST_BATCH_WINDOW)
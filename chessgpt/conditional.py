@@ -0,0 +1,61 @@
+"""
+Conditional GET for game resources.
+
+ETags are built from the game's `modified` timestamp and its latest ply (read
+from the FEN, so no query is needed), plus the latest message id for chat
+history, which doesn't touch the game row. Matching If-None-Match or
+If-Modified-Since headers get a bodyless 304, but If-Modified-Since only
+counts for whole-second timestamps: Last-Modified has one-second resolution,
+so two moves within a second would look the same. Otherwise the rendered body is
+served from a small cache keyed by resource, as long as its ETag still
+matches, so polling clients don't cost a re-render either.
+"""
+
+import chess
+
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from typing import Callable, Tuple
+
+from .models import Game
+
+Rendered = Tuple[bytes, str]  ## (body, content type)
+
+
+def game_etag(game: Game, kind: str, *extra) -> str:
+    """A strong ETag for a resource that changes with the game row."""
+    stamp = int(game.modified.timestamp() * 1_000_000)
+    ply = chess.Board(game.fen).ply()
+    parts = [kind, game.id, stamp, ply, *extra]
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def respond(
+    request: HttpRequest,
+    key: str,
+    etag: str,
+    last_modified: float,
+    render: Callable[[], Rendered],
+) -> HttpResponse:
+    """A 304 if the client is up to date, otherwise the (cached) rendered body."""
+    exact = last_modified == int(last_modified)
+    last_modified = int(last_modified)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified if exact else None
+    )
+
+    if response is None:
+        cached = cache.get(key)
+        if cached is not None and cached[0] == etag:
+            body, content_type = cached[1], cached[2]
+        else:
+            body, content_type = render()
+            cache.set(key, (etag, body, content_type))
+        response = HttpResponse(body, content_type=content_type)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,230 @@
+"""
+Static move evaluator for pruning and resolving move suggestions.
+
+All legal moves of a position are scored in one vectorized pass: material
+won, the change in piece-square value, and a threat map that charges a piece
+left en prise (or credits one moved out of danger), plus a bonus for checks.
+It is nowhere near an engine, but it is good enough to keep blunders out of
+the candidate list sent to OpenAI and to pick between moves when a reply
+names several, or names one ambiguously.
+
+NumPy is optional. Without it, no moves are pruned and replies are resolved
+in the order the moves appear.
+"""
+
+import chess
+import re
+
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+## Centipawns by piece type (index 0 is "no piece"). The king can't be taken.
+VALUES = [0, 100, 320, 330, 500, 900, 0]
+
+CHECK_BONUS = 30
+MATE_BONUS = 100_000
+
+## Simplified evaluation function tables, from White's side, rank 8 first.
+PST = {
+    chess.PAWN: """
+         0   0   0   0   0   0   0   0
+        50  50  50  50  50  50  50  50
+        10  10  20  30  30  20  10  10
+         5   5  10  25  25  10   5   5
+         0   0   0  20  20   0   0   0
+         5  -5 -10   0   0 -10  -5   5
+         5  10  10 -20 -20  10  10   5
+         0   0   0   0   0   0   0   0""",
+    chess.KNIGHT: """
+       -50 -40 -30 -30 -30 -30 -40 -50
+       -40 -20   0   0   0   0 -20 -40
+       -30   0  10  15  15  10   0 -30
+       -30   5  15  20  20  15   5 -30
+       -30   0  15  20  20  15   0 -30
+       -30   5  10  15  15  10   5 -30
+       -40 -20   0   5   5   0 -20 -40
+       -50 -40 -30 -30 -30 -30 -40 -50""",
+    chess.BISHOP: """
+       -20 -10 -10 -10 -10 -10 -10 -20
+       -10   0   0   0   0   0   0 -10
+       -10   0   5  10  10   5   0 -10
+       -10   5   5  10  10   5   5 -10
+       -10   0  10  10  10  10   0 -10
+       -10  10  10  10  10  10  10 -10
+       -10   5   0   0   0   0   5 -10
+       -20 -10 -10 -10 -10 -10 -10 -20""",
+    chess.ROOK: """
+         0   0   0   0   0   0   0   0
+         5  10  10  10  10  10  10   5
+        -5   0   0   0   0   0   0  -5
+        -5   0   0   0   0   0   0  -5
+        -5   0   0   0   0   0   0  -5
+        -5   0   0   0   0   0   0  -5
+        -5   0   0   0   0   0   0  -5
+         0   0   0   5   5   0   0   0""",
+    chess.QUEEN: """
+       -20 -10 -10  -5  -5 -10 -10 -20
+       -10   0   0   0   0   0   0 -10
+       -10   0   5   5   5   5   0 -10
+        -5   0   5   5   5   5   0  -5
+         0   0   5   5   5   5   0  -5
+       -10   5   5   5   5   5   0 -10
+       -10   0   5   0   0   0   0 -10
+       -20 -10 -10  -5  -5 -10 -10 -20""",
+    chess.KING: """
+       -30 -40 -40 -50 -50 -40 -40 -30
+       -30 -40 -40 -50 -50 -40 -40 -30
+       -30 -40 -40 -50 -50 -40 -40 -30
+       -30 -40 -40 -50 -50 -40 -40 -30
+       -20 -30 -30 -40 -40 -30 -30 -20
+       -10 -20 -20 -20 -20 -20 -20 -10
+        20  20   0   0   0   0  20  20
+        20  30  10   0   0  10  30  20""",
+}
+
+if np is not None:
+    ## One row per piece type, indexed by square (a1 = 0) from White's side.
+    _TABLES = np.zeros((7, 64), dtype=np.int32)
+    for _piece, _table in PST.items():
+        _TABLES[_piece] = np.flipud(np.array(_table.split(), dtype=np.int32).reshape(8, 8)).ravel()
+    _VALUES = np.array(VALUES, dtype=np.int32)
+    _BITS = np.arange(64, dtype=np.uint64)
+
+
+def available() -> bool:
+    return np is not None
+
+
+def rank_moves(board: chess.Board) -> List[Tuple[chess.Move, int]]:
+    """Legal moves with their scores, best first."""
+    moves = list(board.legal_moves)
+    if np is None or not moves:
+        return [(move, 0) for move in moves]
+
+    scores = score_moves(board, moves)
+    order = np.argsort(-scores, kind="stable")
+    return [(moves[i], int(scores[i])) for i in order]
+
+
+def top_moves(board: chess.Board, k: int) -> List[chess.Move]:
+    """The `k` best legal moves, or all of them if `k` is 0 or NumPy is missing."""
+    ranked = rank_moves(board)
+    if k <= 0 or np is None:
+        return [move for move, _ in ranked]
+    return [move for move, _ in ranked[:k]]
+
+
+def score_moves(board: chess.Board, moves: List[chess.Move]) -> "np.ndarray":
+    """Scores for the side to move, one per move."""
+    us, them = board.turn, not board.turn
+    flip = 0 if us == chess.WHITE else 56  ## Mirror squares for Black.
+
+    src = np.array([m.from_square for m in moves])
+    dst = np.array([m.to_square for m in moves])
+    piece = np.array([board.piece_type_at(m.from_square) for m in moves])
+    promo = np.array([m.promotion or 0 for m in moves])
+    taken = np.array([_captured(board, m) for m in moves])
+    after = np.where(promo > 0, promo, piece)
+
+    scores = (
+        _TABLES[after, dst ^ flip]
+        - _TABLES[piece, src ^ flip]
+        + _VALUES[taken]
+        + _TABLES[taken, dst ^ (56 ^ flip)]
+        + np.where(promo > 0, _VALUES[promo] - _VALUES[chess.PAWN], 0)
+    )
+
+    ## Threats: what the opponent could win on the destination, and what
+    ## was at risk on the origin square.
+    cheapest = _cheapest_attackers(board, them)
+    defended = _bits(_attacked(board, us))
+    scores -= _exposure(_VALUES[after], cheapest[dst], defended[dst])
+    scores += _exposure(_VALUES[piece], cheapest[src], defended[src])
+
+    for i, move in enumerate(moves):
+        if board.gives_check(move):
+            board.push(move)
+            scores[i] += MATE_BONUS if board.is_checkmate() else CHECK_BONUS
+            board.pop()
+
+    return scores
+
+
+def resolve(board: chess.Board, reply: str) -> Optional[chess.Move]:
+    """The legal move a reply means, or None. Ties go to the best-scored move."""
+    matches = []
+    for token in re.findall(r"[A-Za-z0-9=+#-]+", reply or ""):
+        for move in _parse(board, token):
+            if move not in matches:
+                matches.append(move)
+
+    if len(matches) <= 1 or np is None:
+        return matches[0] if matches else None
+
+    scores = score_moves(board, matches)
+    return matches[int(np.argmax(scores))]
+
+
+def _parse(board: chess.Board, token: str) -> Iterable[chess.Move]:
+    try:
+        move = chess.Move.from_uci(token.lower())
+        if move in board.legal_moves:
+            return [move]
+    except ValueError:
+        pass
+
+    try:
+        return [board.parse_san(token)]
+    except chess.AmbiguousMoveError:
+        ## e.g. "Nd2" with two knights: any of them will do.
+        match = re.search(r"([a-h][1-8])(?:=?([QRBN]))?[+#]?$", token)
+        if match is None:
+            return []
+        piece = chess.PIECE_SYMBOLS.index(token[0].lower()) if token[0] in "NBRQK" else chess.PAWN
+        square = chess.parse_square(match.group(1))
+        return [
+            move
+            for move in board.legal_moves
+            if move.to_square == square and board.piece_type_at(move.from_square) == piece
+        ]
+    except ValueError:
+        return []
+
+
+def _captured(board: chess.Board, move: chess.Move) -> int:
+    if board.is_en_passant(move):
+        return chess.PAWN
+    return board.piece_type_at(move.to_square) or 0
+
+
+def _attacked(board: chess.Board, color: chess.Color) -> int:
+    mask = 0
+    for square in chess.scan_forward(board.occupied_co[color]):
+        mask |= int(board.attacks_mask(square))
+    return mask
+
+
+def _cheapest_attackers(board: chess.Board, color: chess.Color) -> "np.ndarray":
+    """The value of the cheapest piece of `color` attacking each square (0 if none)."""
+    cheapest = np.zeros(64, dtype=np.int32)
+    for piece in sorted(chess.PIECE_TYPES, key=lambda p: -VALUES[p] if p != chess.KING else -10_000):
+        mask = 0
+        for square in chess.scan_forward(board.pieces_mask(piece, color)):
+            mask |= int(board.attacks_mask(square))
+        value = VALUES[piece] or 10_000  ## A king only takes undefended pieces.
+        cheapest[_bits(mask)] = value
+    return cheapest
+
+
+def _exposure(value, attacker, defended) -> "np.ndarray":
+    """Material a piece of `value` stands to lose to `attacker`."""
+    loss = np.where(defended, np.maximum(0, value - attacker), value)
+    return np.where(attacker > 0, loss, 0)
+
+
+def _bits(mask: int) -> "np.ndarray":
+    return ((np.uint64(mask) >> _BITS) & np.uint64(1)).astype(bool)
@@ -0,0 +1,239 @@
+"""
+Push channel for game events, served as Server-Sent Events.
+
+Events are published from request handlers and from the task queue loop.
+Every event is encoded once, no matter how many clients are listening, and
+handed to each event loop with spectators of the game in a single
+`call_soon_threadsafe`; the loop then fans it out to its own subscribers.
+
+A new subscriber first gets a snapshot of the game (FEN plus recent moves),
+then only deltas, which may overlap the snapshot (compare plies). Each
+subscriber has a bounded queue; one that falls too far behind has its backlog
+replaced by a fresh snapshot, so slow spectators cost memory for at most
+QUEUE_SIZE messages and never hold up the others.
+
+Events:
+    snapshot    the game so far ({"fen": ..., "ply": 4, "moves": ["e2e4", ...]})
+    move        a move was committed (the Move as JSON)
+    ai-move     a suggested move is ready ({"ply": 4, "move": "e7e5"})
+    chat        a chat message was added ({"role": ..., "content": ...})
+    outcome     the game is over ({"outcome": "1-0", "message": ...})
+
+Streaming needs an ASGI server (e.g. `uvicorn chessgpt.asgi:application`).
+Django 4.2 stops listening to the client once it has read the request, so
+asgi.py wraps the app in `cancel_on_disconnect` to end streams (and their
+subscriptions) when the client goes away.
+"""
+
+import asyncio
+import chess
+import json
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from . import gamelog
+from .archive import game_moves
+
+LOG = logging.getLogger(__name__)
+
+## Messages a slow subscriber may fall behind before it is resynced.
+QUEUE_SIZE = 64
+
+## Seconds between keep-alive comments on an idle stream.
+KEEPALIVE = 15
+
+## Moves included in a snapshot.
+SNAPSHOT_MOVES = 20
+
+PING = b": ping\n\n"
+RESYNC = b""  ## Queued in place of a dropped backlog.
+
+
+def encode(event: str, data) -> bytes:
+    """Formats one Server-Sent Event."""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    """One listener, bound to the event loop that reads it."""
+
+    def __init__(self, game_id: int):
+        self.game_id = game_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, message: bytes) -> None:
+        """Queue a message. Must run on the subscriber's loop."""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            ## Too far behind: coalesce the backlog into a single snapshot.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class LoopGroup:
+    """The subscribers that live on one event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.games: Dict[int, Set[Subscription]] = {}
+        self.pinger: Optional[asyncio.Task] = None
+
+    def deliver(self, game_id: int, message: bytes) -> None:
+        for subscription in list(self.games.get(game_id, ())):
+            subscription.put(message)
+
+    async def ping(self) -> None:
+        """One timer per loop keeps every idle stream alive."""
+        while True:
+            await asyncio.sleep(KEEPALIVE)
+            for subscribers in list(self.games.values()):
+                for subscription in subscribers:
+                    if subscription.queue.empty():
+                        subscription.put(PING)
+
+
+class EventHub:
+    """Subscribers by game, grouped by event loop."""
+
+    def __init__(self):
+        self._games: Dict[int, Set[LoopGroup]] = {}
+        self._groups: Dict[asyncio.AbstractEventLoop, LoopGroup] = {}
+        self._snapshots: Dict[int, Tuple[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, game_id: int) -> Subscription:
+        """Subscribe on the running loop."""
+        subscription = Subscription(game_id)
+        with self._lock:
+            group = self._groups.get(subscription.loop)
+            if group is None:
+                group = self._groups[subscription.loop] = LoopGroup(subscription.loop)
+                group.pinger = subscription.loop.create_task(group.ping())
+            group.games.setdefault(game_id, set()).add(subscription)
+            self._games.setdefault(game_id, set()).add(group)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            group = self._groups.get(subscription.loop)
+            if group is None:
+                return
+            subscribers = group.games.get(subscription.game_id, set())
+            subscribers.discard(subscription)
+            if subscribers:
+                return
+
+            group.games.pop(subscription.game_id, None)
+            groups = self._games.get(subscription.game_id, set())
+            groups.discard(group)
+            if not groups:
+                self._games.pop(subscription.game_id, None)
+                self._snapshots.pop(subscription.game_id, None)
+            if not group.games:
+                group.pinger.cancel()
+                self._groups.pop(group.loop, None)
+
+    def publish(self, game_id: int, event: str, data) -> None:
+        """Send an event to every subscriber of the game. Safe from any thread."""
+        with self._lock:
+            groups = list(self._games.get(game_id, ()))
+        if not groups:
+            return
+
+        message = encode(event, data)
+        for group in groups:
+            try:
+                group.loop.call_soon_threadsafe(group.deliver, game_id, message)
+            except RuntimeError:
+                LOG.warning(f"Dropped an event for game {game_id}; its loop is closed")
+
+    def subscribers(self, game_id: int) -> int:
+        with self._lock:
+            groups = list(self._games.get(game_id, ()))
+        return sum(len(group.games.get(game_id, ())) for group in groups)
+
+    async def snapshot(self, game_id: int) -> bytes:
+        """The encoded snapshot event, shared until the next move."""
+        game = await gamelog.aget_game(game_id)
+        cached = self._snapshots.get(game_id)
+        if cached is not None and cached[0] == game.version:
+            return cached[1]
+
+        ## Take the position from the moves, in case one was made since.
+        moves = await sync_to_async(game_moves)(game)
+        fen = moves[-1]["fen"] if moves else game.fen
+        message = encode(
+            "snapshot",
+            {
+                "game": game.id,
+                "fen": fen,
+                "ply": chess.Board(fen).ply(),
+                "outcome": game.outcome,
+                "moves": [move["uci"] for move in moves[-SNAPSHOT_MOVES:]],
+            },
+        )
+        with self._lock:
+            if game_id in self._games:
+                self._snapshots[game_id] = (game.version, message)
+        return message
+
+    async def stream(self, subscription: Subscription) -> AsyncIterator[bytes]:
+        """The body of a text/event-stream response: a snapshot, then deltas."""
+        try:
+            yield await self.snapshot(subscription.game_id)
+            while True:
+                message = await subscription.queue.get()
+                if message == RESYNC:
+                    message = await self.snapshot(subscription.game_id)
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+
+hub = EventHub()
+
+
+def cancel_on_disconnect(app):
+    """ASGI middleware that cancels an event stream when its client disconnects."""
+
+    async def middleware(scope, receive, send):
+        if scope["type"] != "http":
+            return await app(scope, receive, send)
+
+        streaming = asyncio.Event()
+
+        async def watch_send(message):
+            if message["type"] == "http.response.start":
+                for name, value in message.get("headers", ()):
+                    if name.lower() == b"content-type" and value.startswith(b"text/event-stream"):
+                        streaming.set()
+            await send(message)
+
+        async def watch_disconnect():
+            ## Django has read the whole request by the time it responds,
+            ## so nothing else is waiting on `receive` now.
+            await streaming.wait()
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        handler = asyncio.ensure_future(app(scope, receive, watch_send))
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await asyncio.wait({handler, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+            handler.cancel()
+            await asyncio.gather(handler, watcher, return_exceptions=True)
+
+        if not handler.cancelled():
+            handler.result()
+
+    return middleware
@@ -0,0 +1,161 @@
+"""
+Append-only event log for game state.
+
+With GAME_EVENT_LOG enabled, a move is a single `GameEvent` insert (plus an
+outcome event in the same statement when it ends the game) instead of a
+`ChatHistory` row, a `Move` row and a rewrite of the `Game` row. The log's
+unique (game, seq) constraint makes the insert its own compare-and-swap: of
+two moves made from the same position, only one gets the next seq.
+
+The `Game` row is the snapshot: its `fen`, `outcome` and `version` are
+brought up to date every GAME_SNAPSHOT_INTERVAL events, and when the game
+ends, in the background. Readers load the row and replay the log tail after
+`version`, which is never more than a few events. The "X plays e2e4" chat
+lines are derived from move events rather than stored.
+
+Reads always include the log, so games logged while the setting was on stay
+readable after it is turned off. With the setting off, moves compare against
+the `Game` row again, so reading a game also folds any log tail into the row.
+
+Logged moves have no `Move` row, so they have no id.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.shortcuts import get_object_or_404
+from typing import List
+
+from . import tasks
+from .models import Game, GameEvent, Move
+
+
+def enabled() -> bool:
+    """Whether new moves are logged."""
+    return settings.GAME_EVENT_LOG
+
+
+def replay(game: Game, events: List[GameEvent]) -> Game:
+    """Applies events after the snapshot to the (unsaved) game."""
+    for event in events:
+        if event.kind == "move":
+            game.fen = event.data["fen"]
+        elif event.kind == "outcome":
+            game.outcome = event.data["outcome"]
+        game.version = event.seq
+        game.modified = event.created
+    return game
+
+
+def get_game(game_id: int) -> Game:
+    """The game with its log tail applied, or a 404."""
+    game = get_object_or_404(Game, id=game_id)
+    game.snapshot_version = game.version
+    events = list(_tail(game))
+    replay(game, events)
+
+    if events and not enabled():
+        ## The log was turned off before this game caught up with it.
+        if _snapshot(game).update(**_snapshot_fields(game)):
+            game.snapshot_version = game.version
+    return game
+
+
+async def aget_game(game_id: int) -> Game:
+    return await sync_to_async(get_game)(game_id)
+
+
+def _tail(game: Game):
+    return GameEvent.objects.filter(game=game, seq__gt=game.version).order_by("seq")
+
+
+def _snapshot(game: Game):
+    """The game row, if it is still at the version the game was loaded at."""
+    return Game.objects.filter(id=game.id, version=game.snapshot_version)
+
+
+def _snapshot_fields(game: Game) -> dict:
+    return dict(fen=game.fen, outcome=game.outcome, version=game.version, modified=game.modified)
+
+
+async def append_move(
+    game: Game, uci: str, san: str, fen: str, ply: int, content: str
+) -> Move:
+    """Logs a move made from the (replayed) game. Returns None if another move won."""
+    events = [
+        GameEvent(
+            game=game,
+            seq=game.version + 1,
+            kind="move",
+            data={"uci": uci, "san": san, "fen": fen, "ply": ply, "outcome": content},
+        )
+    ]
+    if content:
+        events.append(
+            GameEvent(
+                game=game,
+                seq=game.version + 2,
+                kind="outcome",
+                data={"outcome": game.outcome, "message": content},
+            )
+        )
+
+    try:
+        events = await GameEvent.objects.abulk_create(events)
+    except IntegrityError:
+        return None
+
+    ## Snapshot in the background, so the move stays a single insert.
+    seq = events[-1].seq
+    since = seq - getattr(game, "snapshot_version", game.version)
+    if content or since >= settings.GAME_SNAPSHOT_INTERVAL:
+        tasks.queue.spawn(compact(game.id))
+
+    return Move(game=game, outcome=content, ply=ply, uci=uci, san=san, fen=fen)
+
+
+async def compact(game_id: int) -> bool:
+    """Brings the game row up to date with its log."""
+    game = await Game.objects.aget(id=game_id)
+    game.snapshot_version = game.version
+    events = [event async for event in _tail(game)]
+    if not events:
+        return False
+
+    replay(game, events)
+    return bool(await _snapshot(game).aupdate(**_snapshot_fields(game)))
+
+
+def logged_moves(game: Game) -> List[dict]:
+    """Move events as dicts with the fields of a `Move`."""
+    events = GameEvent.objects.filter(game=game, kind="move").order_by("seq")
+    return [
+        {
+            "id": None,
+            "game_id": game.id,
+            "outcome": event.data["outcome"],
+            "ply": event.data["ply"],
+            "uci": event.data["uci"],
+            "san": event.data["san"],
+            "fen": event.data["fen"],
+        }
+        for event in events
+    ]
+
+
+def logged_chats(game: Game) -> List[dict]:
+    """The "X plays e2e4" chat lines of logged moves."""
+    events = GameEvent.objects.filter(game=game, kind="move").order_by("seq")
+    return [
+        {
+            "id": None,
+            "role": "user",
+            "content": f"{_player(game, event.data['ply'])} plays {event.data['uci']}",
+            "created": event.created,
+        }
+        for event in events
+    ]
+
+
+def _player(game: Game, ply: int) -> str:
+    return game.white if ply % 2 == 0 else game.black
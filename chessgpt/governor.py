@@ -0,0 +1,253 @@
+"""
+Shared governor for outbound OpenAI calls.
+
+Every completion goes through `governor.chat_completion`, which waits for a
+free slot before calling OpenAI. A slot needs room in two token buckets
+(requests per minute and tokens per minute) and a free place under the
+concurrency limit. Waiters are served by priority, so suggested moves are not
+stuck behind chat. A 429 empties the request bucket for everyone, and the call
+is retried with jittered exponential backoff.
+
+Callers may live on different event loops (request loops and the task queue
+loop), so the shared state is guarded by a thread lock and waiters are woken
+on their own loop.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import openai
+import random
+import threading
+import time
+
+from django.conf import settings
+from typing import Dict, List
+
+LOG = logging.getLogger(__name__)
+
+## Lower numbers are served first.
+PRIORITY_MOVE = 0
+PRIORITY_CHAT = 1
+PRIORITY_HELLO = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_MOVE: "move",
+    PRIORITY_CHAT: "chat",
+    PRIORITY_HELLO: "hello",
+}
+
+## Reserved for the reply when the request doesn't set max_tokens.
+DEFAULT_COMPLETION_TOKENS = 256
+
+BACKOFF_BASE = 0.5  ## seconds
+BACKOFF_MAX = 20.0  ## seconds
+
+
+def estimate_tokens(messages: List[dict]) -> int:
+    """Rough token count of a list of chat messages (about 4 characters per token)."""
+    return sum(4 + len(m.get("content") or "") // 4 for m in messages) + 3
+
+
+class TokenBucket:
+    """Allows `per_minute` units per minute, refilled continuously."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def delay(self, amount: int) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: int) -> None:
+        self._refill()
+        self.tokens -= amount
+
+    def give(self, amount: int) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self) -> None:
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class _Waiter:
+    def __init__(self, priority: int, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass  ## Loop is closed; the waiter is gone.
+
+
+class Governor:
+    """Rate limiter and concurrency governor for OpenAI requests."""
+
+    def __init__(
+        self,
+        requests_per_minute: int = 3500,
+        tokens_per_minute: int = 90000,
+        concurrency: int = 8,
+        max_retries: int = 5,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+        self._active = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+        self._queue_times: Dict[int, List[float]] = {
+            p: [0, 0.0, 0.0] for p in PRIORITY_NAMES  ## count, total, max
+        }
+        self._rate_limited = 0
+        self._retries = 0
+
+    async def acquire(self, priority: int, tokens: int) -> float:
+        """Wait for a slot. Returns the time spent in the queue, in seconds."""
+        started = time.monotonic()
+        waiter = _Waiter(priority, next(self._seq))
+        with self._lock:
+            heapq.heappush(self._waiters, waiter)
+
+        try:
+            while True:
+                with self._lock:
+                    waiter.event.clear()
+                    delay = self._try_acquire(waiter, tokens)
+                if delay == 0:
+                    break
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                self._wake_next()
+            raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            stats = self._queue_times.setdefault(priority, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += waited
+            stats[2] = max(stats[2], waited)
+        return waited
+
+    def release(self, reserved: int, used: int = None) -> None:
+        """Free a slot, correcting the token bucket with the actual usage."""
+        with self._lock:
+            self._active -= 1
+            if used is not None:
+                if used < reserved:
+                    self.tokens.give(reserved - used)
+                else:
+                    self.tokens.take(used - reserved)
+            self._wake_next()
+
+    async def chat_completion(self, priority: int = PRIORITY_CHAT, **kwargs):
+        """`openai.ChatCompletion.acreate` with rate limiting and retries."""
+        reserved = estimate_tokens(kwargs.get("messages", [])) + kwargs.get(
+            "max_tokens", DEFAULT_COMPLETION_TOKENS
+        )
+
+        for attempt in itertools.count():
+            waited = await self.acquire(priority, reserved)
+            if waited > 1:
+                LOG.info(f"OpenAI {PRIORITY_NAMES.get(priority)} call queued {waited:.1f}s")
+
+            used = None
+            try:
+                completion = await openai.ChatCompletion.acreate(**kwargs)
+                used = completion.get("usage", {}).get("total_tokens")
+                return completion
+            except openai.error.RateLimitError:
+                with self._lock:
+                    self._rate_limited += 1
+                    self.requests.drain()  ## Everybody backs off, not just us.
+                if attempt >= self.max_retries:
+                    raise
+            finally:
+                self.release(reserved, used)
+
+            backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt)
+            with self._lock:
+                self._retries += 1
+            await asyncio.sleep(random.uniform(backoff / 2, backoff))
+
+    def metrics(self) -> dict:
+        """Queue-time and throttling statistics."""
+        with self._lock:
+            queue_times = {
+                PRIORITY_NAMES.get(p, str(p)): {
+                    "count": count,
+                    "avg_ms": round(1000 * total / count, 1) if count else 0,
+                    "max_ms": round(1000 * longest, 1),
+                }
+                for p, (count, total, longest) in self._queue_times.items()
+            }
+            return {
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "rate_limited": self._rate_limited,
+                "retries": self._retries,
+                "queue_times": queue_times,
+            }
+
+    def _try_acquire(self, waiter: _Waiter, tokens: int) -> float:
+        """Take a slot for the waiter, or return how long to wait (None = until woken).
+        Caller holds the lock."""
+        if self._waiters[0] is not waiter or self._active >= self.concurrency:
+            return None
+
+        delay = max(self.requests.delay(1), self.tokens.delay(tokens))
+        if delay > 0:
+            return delay
+
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self._active += 1
+        heapq.heappop(self._waiters)
+        self._wake_next()
+        return 0
+
+    def _wake_next(self):
+        """Let the next waiter check for a slot. Caller holds the lock."""
+        if self._waiters and self._active < self.concurrency:
+            self._waiters[0].wake()
+
+
+governor = Governor(
+    requests_per_minute=settings.OPENAI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.OPENAI_TOKENS_PER_MINUTE,
+    concurrency=settings.OPENAI_CONCURRENCY,
+    max_retries=settings.OPENAI_MAX_RETRIES,
+)
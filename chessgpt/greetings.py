@@ -0,0 +1,89 @@
+"""
+Pre-generated greetings for the /hello endpoint.
+
+Greetings are generated ahead of time on the task queue loop and handed out
+in random order, so starting the client doesn't wait on OpenAI. The pool is
+filled when the server loads (see asgi.py and wsgi.py) and topped up in the
+background when it runs low; only an empty pool falls back to generating a
+greeting while the client waits.
+"""
+
+import logging
+import random
+import threading
+
+from django.conf import settings
+from typing import List
+
+from . import tasks
+from .governor import governor, PRIORITY_HELLO
+
+LOG = logging.getLogger(__name__)
+
+
+async def generate_greeting() -> str:
+    completion = await governor.chat_completion(
+        PRIORITY_HELLO,
+        model="gpt-3.5-turbo-0613",
+        temperature=0.8,
+        messages=[
+            {
+                "role": "system",
+                "content": "You are a jocular chess player looking for an opponent.",
+            },
+            {"role": "user", "content": "Hello!"},
+        ],
+    )
+
+    return completion.choices[0].message.content
+
+
+class GreetingPool:
+    """A pool of greetings, refilled in the background."""
+
+    def __init__(self, size: int = 8, low: int = 3):
+        self.size = size
+        self.low = low
+        self.greetings: List[str] = []
+        self._refilling = False
+        self._lock = threading.Lock()
+
+    async def get(self) -> str:
+        """A random greeting from the pool, or a fresh one if the pool is empty."""
+        with self._lock:
+            greeting = None
+            if self.greetings:
+                index = random.randrange(len(self.greetings))
+                greeting = self.greetings.pop(index)
+
+        self.refill()
+        if greeting is None:
+            greeting = await generate_greeting()
+        return greeting
+
+    def refill(self) -> None:
+        """Start topping up the pool, if it is low and not already being filled."""
+        with self._lock:
+            if self._refilling or len(self.greetings) > self.low:
+                return
+            self._refilling = True
+        tasks.queue.spawn(self._refill())
+
+    async def _refill(self):
+        try:
+            ## Give up after a few duplicates rather than looping forever.
+            for _ in range(self.size * 2):
+                if len(self.greetings) >= self.size:
+                    break
+                greeting = await generate_greeting()
+                with self._lock:
+                    if greeting not in self.greetings:
+                        self.greetings.append(greeting)
+        except Exception as e:
+            LOG.error(f"Unable to refill greetings: {e}")
+        finally:
+            with self._lock:
+                self._refilling = False
+
+
+pool = GreetingPool(size=settings.GREETING_POOL_SIZE, low=settings.GREETING_POOL_LOW)
@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chessgpt.archive import archive_game, finished_games
+
+
+class Command(BaseCommand):
+    help = "Move finished games into compressed cold storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=1, help="Only games finished at least this many days ago."
+        )
+        parser.add_argument("--limit", type=int, default=None, help="Archive at most this many games.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        games = finished_games().filter(modified__lte=cutoff).order_by("modified")
+        if options["limit"]:
+            games = games[: options["limit"]]
+
+        count = 0
+        for game in games.iterator():
+            archive = archive_game(game)
+            count += 1
+            self.stdout.write(
+                f"Game {game.id}: {archive.moves} moves, {archive.chats} messages, "
+                f"{len(archive.blob)} bytes ({archive.codec})"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {count} games."))
@@ -0,0 +1,94 @@
+import importlib
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from pathlib import Path
+
+from chessgpt.search import FTS_TABLE, SEARCH_SQL, match_query
+
+WORDS = (
+    "white black plays opening gambit defense castle king queen rook bishop knight pawn "
+    "check mate endgame sacrifice tempo fork pin skewer tactic center file rank diagonal "
+    "famous match history strategy position advantage draw resign blunder brilliant"
+).split()
+
+FAMOUS = ["Immortal Game", "Evergreen Game", "Opera Game", "Game of the Century"]
+
+
+class Command(BaseCommand):
+    help = "Compare LIKE and FTS5 chat search on a synthetic history (uses a scratch database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--query", default="Immortal Game")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = sqlite3.connect(Path(tmp) / "bench.sqlite3")
+            self._create(db)
+
+            started = time.perf_counter()
+            self._populate(db, options["rows"], random.Random(options["seed"]))
+            self.stdout.write(f"Inserted {options['rows']:,} rows in {time.perf_counter() - started:.1f}s")
+
+            query = options["query"]
+            like, like_ms = self._time(
+                db,
+                "SELECT id FROM chessgpt_chathistory WHERE content LIKE ?",
+                [f"%{query}%"],
+                options["repeat"],
+            )
+            fts, fts_ms = self._time(
+                db,
+                SEARCH_SQL.replace("%s", "?"),
+                [match_query(query), match_query(query), 20, 0],
+                options["repeat"],
+            )
+
+            self.stdout.write(f"LIKE:  {like_ms:8.2f} ms ({len(like)} rows, unranked, unpaged)")
+            self.stdout.write(f"FTS5:  {fts_ms:8.2f} ms ({len(fts)} rows, ranked with snippets)")
+            if fts:
+                self.stdout.write(f"Top hit: {fts[0][4]}")
+            db.close()
+
+    def _create(self, db: sqlite3.Connection):
+        ## Reuse the statements of the migration, so the benchmark matches production.
+        hot = importlib.import_module("chessgpt.migrations.0009_chathistory_fts")
+        archived = importlib.import_module("chessgpt.migrations.0012_archivedchat_fts")
+
+        db.execute(
+            """CREATE TABLE chessgpt_chathistory (
+                id INTEGER PRIMARY KEY, game_id INTEGER, role TEXT, content TEXT, created TEXT
+            )"""
+        )
+        db.execute("CREATE TABLE chessgpt_gamearchive (game_id INTEGER PRIMARY KEY)")
+        for sql in hot.CREATE_SQL + archived.CREATE_SQL:
+            db.execute(sql)
+
+    def _populate(self, db: sqlite3.Connection, rows: int, rng: random.Random):
+        def messages():
+            for n in range(rows):
+                words = rng.choices(WORDS, k=rng.randint(4, 30))
+                if rng.random() < 0.001:
+                    words.insert(rng.randrange(len(words)), rng.choice(FAMOUS))
+                role = "assistant" if n % 2 else "user"
+                yield (n // 40, role, " ".join(words), "2023-10-15 00:00:00")
+
+        db.executemany(
+            "INSERT INTO chessgpt_chathistory (game_id, role, content, created) VALUES (?, ?, ?, ?)",
+            messages(),
+        )
+        db.commit()
+        db.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+    def _time(self, db: sqlite3.Connection, sql: str, params: list, repeat: int):
+        rows = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            rows = db.execute(sql, params).fetchall()
+        return rows, 1000 * (time.perf_counter() - started) / repeat
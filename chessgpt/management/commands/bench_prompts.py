@@ -0,0 +1,90 @@
+import chess
+import chess.pgn
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from chessgpt import evaluator
+from chessgpt.prompts import MovePrompt, build_move_prompt
+
+exporter = chess.pgn.StringExporter(headers=False, variations=False, comments=False)
+
+
+def build_legacy_move_prompt(board: chess.Board) -> MovePrompt:
+    """The prompt `post_chess_next` used to send: chat history, FEN, PGN and legal moves."""
+    players = ["Black", "White"]
+    msgs = [{"role": "user", "content": "White, what's your opening move?"}]
+
+    replay = board.root()
+    for move in board.move_stack:
+        msgs.append({"role": "user", "content": f"{players[replay.turn]} plays {move.uci()}"})
+        replay.push(move)
+
+    msgs.append(
+        {
+            "role": "system",
+            "content": "Respond with next move in UCI format, e.g. 'e2e4' or 'e7e8q'. No other text is allowed.",
+        }
+    )
+    msgs.append({"role": "assistant", "content": "FEN: " + board.fen()})
+    msgs.append({"role": "assistant", "content": "PGN: " + chess.pgn.Game.from_board(board).accept(exporter)})
+
+    legal_moves = [x.uci() for x in board.legal_moves]
+    msgs.append({"role": "user", "content": "Choose one: " + str(legal_moves)})
+    return MovePrompt(msgs)
+
+
+class Command(BaseCommand):
+    help = "Compare the size of the legacy and compact move prompts across game lengths (offline)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=50, help="Random games per length.")
+        parser.add_argument("--plies", type=int, nargs="+", default=[0, 10, 20, 40, 80, 120])
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--candidates", type=int, default=12, help="Moves kept by the evaluator.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+
+        self.stdout.write(
+            f"{'plies':>6} {'legacy':>8} {'compact':>8} {'saved':>7} {'build ms':>9} {'pruned':>8} {'rank ms':>8}"
+        )
+        for plies in options["plies"]:
+            legacy = compact = pruned = 0
+            elapsed = ranking = 0.0
+            for _ in range(options["games"]):
+                board = self._random_game(rng, plies)
+                history = self._san_history(board)
+
+                legacy += build_legacy_move_prompt(board).tokens
+                started = time.perf_counter()
+                compact += build_move_prompt(board, history).tokens
+                elapsed += time.perf_counter() - started
+
+                started = time.perf_counter()
+                candidates = evaluator.top_moves(board, options["candidates"])
+                ranking += time.perf_counter() - started
+                pruned += build_move_prompt(board, history, candidates).tokens
+
+            games = options["games"]
+            self.stdout.write(
+                f"{plies:>6} {legacy // games:>8} {compact // games:>8} "
+                f"{1 - compact / legacy:>7.0%} {1000 * elapsed / games:>9.3f} "
+                f"{pruned // games:>8} {1000 * ranking / games:>8.3f}"
+            )
+
+    def _random_game(self, rng: random.Random, plies: int) -> chess.Board:
+        """Plays random legal moves, stopping early if the game ends."""
+        board = chess.Board()
+        while board.ply() < plies and not board.is_game_over():
+            board.push(rng.choice(list(board.legal_moves)))
+        return board
+
+    def _san_history(self, board: chess.Board) -> list:
+        replay = board.root()
+        history = []
+        for move in board.move_stack:
+            history.append(replay.san(move))
+            replay.push(move)
+        return history
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from chessgpt.events import RESYNC, EventHub
+
+
+class Command(BaseCommand):
+    help = "Measure event fan-out to many spectators of one game (in-process, no database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--spectators", type=int, default=10_000)
+        parser.add_argument("--events", type=int, default=200)
+        parser.add_argument("--slow", type=float, default=0.01, help="Fraction of spectators that never read.")
+
+    def handle(self, *args, **options):
+        asyncio.run(self._run(options["spectators"], options["events"], options["slow"]))
+
+    async def _run(self, spectators: int, events: int, slow: float):
+        hub = EventHub()
+        tracemalloc.start()
+        subscriptions = [hub.subscribe(1) for _ in range(spectators)]
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        slow_count = int(spectators * slow)
+        readers = subscriptions[slow_count:]
+        received = [0]
+        caught_up = threading.Event()
+
+        async def read(subscription):
+            while True:
+                await subscription.queue.get()
+                received[0] += 1
+                if received[0] % len(readers) == 0:
+                    caught_up.set()
+
+        tasks = [asyncio.create_task(read(subscription)) for subscription in readers]
+
+        ## Publish from another thread, as request handlers and the task queue do,
+        ## and time how long each event takes to reach every reading spectator.
+        def publish(latencies):
+            for ply in range(events):
+                caught_up.clear()
+                started = time.perf_counter()
+                hub.publish(1, "move", {"ply": ply, "uci": "e2e4", "fen": "8/8/8/8/8/8/8/8 w - - 0 1"})
+                caught_up.wait()
+                latencies.append(time.perf_counter() - started)
+
+        latencies = []
+        await asyncio.to_thread(publish, latencies)
+        for task in tasks:
+            task.cancel()
+
+        latencies.sort()
+        total = sum(latencies)
+        backlog = max((s.queue.qsize() for s in subscriptions[:slow_count]), default=0)
+        resynced = sum(1 for s in subscriptions[:slow_count] if RESYNC in s.queue._queue)
+
+        self.stdout.write(f"{spectators:,} spectators, {events} events, {received[0]:,} deliveries")
+        self.stdout.write(
+            f"Fan-out per event: median {1000 * latencies[len(latencies) // 2]:.2f} ms, "
+            f"max {1000 * latencies[-1]:.2f} ms ({received[0] / total:,.0f} deliveries/s)"
+        )
+        self.stdout.write(f"{slow_count} slow spectators: longest queue {backlog}, {resynced} due a snapshot")
+        self.stdout.write(f"{memory / spectators:,.0f} bytes per idle subscription")
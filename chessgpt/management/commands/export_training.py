@@ -0,0 +1,186 @@
+import chess
+import django
+import json
+import os
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, F, Max
+from multiprocessing import Pool
+from pathlib import Path
+
+from chessgpt.archive import UNFINISHED, game_moves
+from chessgpt.models import Game
+from chessgpt.timeline import pack_move, positions
+
+## Bitboard planes: white P N B R Q K, then black p n b r q k.
+PLANES = [(color, piece) for color in chess.COLORS for piece in chess.PIECE_TYPES]
+
+RESULTS = {"1-0": 1, "0-1": -1, "1/2-1/2": 0}
+
+## name: (dtype, shape of one position)
+FIELDS = {
+    "boards": ("uint64", (12,)),  ## one 64-bit mask per plane, a1 = bit 0
+    "turn": ("uint8", ()),  ## 1 = white to move
+    "castling": ("uint8", ()),  ## bits: 1 = K, 2 = Q, 4 = k, 8 = q
+    "move": ("uint16", ()),  ## from | to << 6 | promotion piece type << 12
+    "result": ("int8", ()),  ## final result for white: 1, 0 or -1
+    "game": ("int32", ()),
+    "ply": ("int16", ()),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Export every position of finished games, with the move played and the result, "
+        "as .npy arrays that can be memory-mapped for training."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", type=Path)
+        parser.add_argument("--chunk-size", type=int, default=256, help="Game ids per chunk.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            raise CommandError("Install numpy to export training data.")
+
+        output: Path = options["output"]
+        size = options["chunk_size"]
+        output.mkdir(parents=True, exist_ok=True)
+
+        ## Chunks are fixed ranges of game ids, so a restarted export skips
+        ## the chunks that are already written. A chunk is written again when
+        ## a game in its range has finished since.
+        stamps = chunk_stamps(size)
+        last = max(stamps, default=0)
+        chunks = [
+            (output, n, n * size + 1, (n + 1) * size, stamps.get(n, ""))
+            for n in range(last + 1)
+        ]
+        todo = [chunk for chunk in chunks if read_stamp(output, chunk[1]) != chunk[4]]
+        self.stdout.write(f"{len(chunks) - len(todo)} of {len(chunks)} chunks already exported")
+
+        ## Forked workers must open their own database connections, and
+        ## spawned ones (the default on macOS and Windows) must set up Django.
+        connections.close_all()
+        with Pool(max(1, options["workers"]), initializer=django.setup) as pool:
+            for n, positions in pool.imap_unordered(export_chunk, todo):
+                self.stdout.write(f"Chunk {n}: {positions} positions")
+
+        total = merge(output, [chunk_dir(output, chunk[1]) for chunk in chunks])
+        self.stdout.write(self.style.SUCCESS(f"Exported {total} positions to {output}"))
+
+
+def finished():
+    return Game.objects.exclude(outcome__isnull=True).exclude(outcome__in=UNFINISHED)
+
+
+def chunk_dir(output: Path, n: int) -> Path:
+    return output / "chunks" / f"{n:06d}"
+
+
+def chunk_stamps(size: int) -> dict:
+    """The count and latest change of finished games, by chunk."""
+    rows = (
+        finished()
+        .annotate(chunk=(F("id") - 1) / size)
+        .values("chunk")
+        .annotate(games=Count("id"), latest=Max("modified"))
+    )
+    return {row["chunk"]: f"{row['games']} {row['latest'].isoformat()}" for row in rows}
+
+
+def read_stamp(output: Path, n: int):
+    """The stamp a chunk was written with, or None if it wasn't written."""
+    try:
+        return (chunk_dir(output, n) / "stamp").read_text()
+    except FileNotFoundError:
+        return None
+
+
+def export_chunk(chunk) -> tuple:
+    """Writes the positions of one range of games. Runs in a worker process."""
+    import numpy as np
+
+    output, n, first, last, stamp = chunk
+    rows = {name: [] for name in FIELDS}
+    for game in finished().filter(id__gte=first, id__lte=last).order_by("id"):
+        for row in game_positions(game):
+            for name, value in zip(FIELDS, row):
+                rows[name].append(value)
+
+    ## Write to a temporary directory and rename it, so a chunk either
+    ## exists completely or not at all.
+    target = chunk_dir(output, n)
+    partial = target.with_suffix(".partial")
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir(parents=True)
+    for name, (dtype, shape) in FIELDS.items():
+        array = np.array(rows[name], dtype=dtype).reshape((-1, *shape))
+        np.save(partial / f"{name}.npy", array)
+    (partial / "stamp").write_text(stamp)
+    shutil.rmtree(target, ignore_errors=True)
+    partial.rename(target)
+
+    return n, len(rows["ply"])
+
+
+def game_positions(game: Game):
+    """(boards, turn, castling, move, result, game, ply) for every move of a game."""
+    result = RESULTS.get(game.outcome.strip())
+    if result is None:
+        return
+
+    for stored, move, board in positions(game_moves(game)):
+        ## Skip moves that don't lead to the stored position (e.g. the first
+        ## move of a game set up from a FEN).
+        if move is None:
+            continue
+
+        before = board.copy(stack=1)
+        before.pop()
+        yield (
+            [before.pieces_mask(piece, color) for color, piece in PLANES],
+            int(before.turn),
+            castling(before),
+            pack_move(move),
+            result,
+            game.id,
+            stored["ply"],
+        )
+
+
+def castling(board: chess.Board) -> int:
+    return (
+        board.has_kingside_castling_rights(chess.WHITE)
+        | board.has_queenside_castling_rights(chess.WHITE) << 1
+        | board.has_kingside_castling_rights(chess.BLACK) << 2
+        | board.has_queenside_castling_rights(chess.BLACK) << 3
+    )
+
+
+def merge(output: Path, chunks: list) -> int:
+    """Concatenates the chunks into one memory-mapped array per field."""
+    import numpy as np
+
+    counts = [np.load(chunk / "ply.npy", mmap_mode="r").shape[0] for chunk in chunks]
+    total = sum(counts)
+
+    for name, (dtype, shape) in FIELDS.items():
+        partial = output / f"{name}.partial.npy"
+        array = np.lib.format.open_memmap(partial, mode="w+", dtype=dtype, shape=(total, *shape))
+        offset = 0
+        for chunk, count in zip(chunks, counts):
+            array[offset : offset + count] = np.load(chunk / f"{name}.npy", mmap_mode="r")
+            offset += count
+        array.flush()
+        del array
+        os.replace(partial, output / f"{name}.npy")
+
+    layout = {name: {"dtype": dtype, "shape": [total, *shape]} for name, (dtype, shape) in FIELDS.items()}
+    (output / "layout.json").write_text(json.dumps({"positions": total, "fields": layout}, indent=2))
+    return total
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chessgpt', '0007_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codec', models.CharField(help_text='Compression of the blob.', max_length=10)),
+                ('blob', models.BinaryField(help_text='Compressed JSON of moves and chat history.')),
+                ('moves', models.IntegerField(default=0, help_text='Number of archived moves.')),
+                ('chats', models.IntegerField(default=0, help_text='Number of archived messages.')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='chessgpt.game')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chessgpt', '0009_chathistory_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='version',
+            field=models.IntegerField(default=0, help_text='Incremented by every move.'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chessgpt', '0010_game_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='game',
+            name='version',
+            field=models.IntegerField(default=0, help_text='Incremented by every move (or logged event).'),
+        ),
+        migrations.CreateModel(
+            name='GameEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.IntegerField(help_text="Position in the game's log; see Game.version.")),
+                ('kind', models.CharField(choices=[('move', 'Move'), ('outcome', 'Outcome')], max_length=10)),
+                ('data', models.JSONField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='chessgpt.game')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='gameevent',
+            constraint=models.UniqueConstraint(fields=('game', 'seq'), name='unique_event_seq'),
+        ),
+    ]
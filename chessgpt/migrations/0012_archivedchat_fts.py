@@ -0,0 +1,73 @@
+# Keeps archived chat messages searchable (see search.py).
+
+import json
+import zlib
+
+from django.db import migrations
+
+ARCHIVE_TABLE = "chessgpt_archivedchat_fts"
+
+CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {ARCHIVE_TABLE} USING fts5(
+        content, chat_id UNINDEXED, game_id UNINDEXED, role UNINDEXED, created UNINDEXED,
+        tokenize='porter unicode61'
+    )""",
+]
+
+INSERT_SQL = f"""
+    INSERT INTO {ARCHIVE_TABLE} (content, chat_id, game_id, role, created)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+DROP_SQL = [
+    f"DROP TABLE IF EXISTS {ARCHIVE_TABLE}",
+]
+
+
+def create_index(apps, schema_editor):
+    ## FTS5 is specific to SQLite.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+    ## Index the games archived before this migration. The helpers are
+    ## copied here, so later changes to the app don't change this migration.
+    GameArchive = apps.get_model("chessgpt", "GameArchive")
+    with schema_editor.connection.cursor() as cursor:
+        for archive in GameArchive.objects.iterator():
+            data = json.loads(decompress(archive.codec, bytes(archive.blob)))
+            cursor.executemany(
+                INSERT_SQL,
+                [
+                    (chat["content"], chat["id"], archive.game_id, chat["role"], chat["created"])
+                    for chat in data["chats"]
+                    if chat.get("id") is not None
+                ],
+            )
+
+
+def decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chessgpt', '0011_gameevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
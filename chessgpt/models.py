@@ -14,6 +14,9 @@ class Game(models.Model):
     pgn = models.TextField(null=True, blank=True, help_text="PGN of game.")
     date = models.DateField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
+    version = models.IntegerField(
+        default=0, help_text="Incremented by every move (or logged event)."
+    )
 
     def __str__(self):
         return self.event
@@ -52,3 +55,61 @@ class ChatHistory(models.Model):
 
     def toMessage(self):
         return {"role": self.role, "content": self.content}
+
+
+class Task(models.Model):
+    TASK_STATUS = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, help_text="Name of the task handler.")
+    ply = models.IntegerField(help_text="Ply of the position the task was queued for.")
+    status = models.CharField(max_length=10, choices=TASK_STATUS, default="pending")
+    result = models.TextField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["game", "kind", "ply"], name="unique_task_per_ply"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.game_id}@{self.ply} ({self.status})"
+
+
+class GameArchive(models.Model):
+    game = models.OneToOneField(Game, on_delete=models.CASCADE)
+    codec = models.CharField(max_length=10, help_text="Compression of the blob.")
+    blob = models.BinaryField(help_text="Compressed JSON of moves and chat history.")
+    moves = models.IntegerField(default=0, help_text="Number of archived moves.")
+    chats = models.IntegerField(default=0, help_text="Number of archived messages.")
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archive of game {self.game_id} ({self.codec})"
+
+
+class GameEvent(models.Model):
+    EVENT_KINDS = [
+        ("move", "Move"),
+        ("outcome", "Outcome"),
+    ]
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    seq = models.IntegerField(help_text="Position in the game's log; see Game.version.")
+    kind = models.CharField(max_length=10, choices=EVENT_KINDS)
+    data = models.JSONField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["game", "seq"], name="unique_event_seq")
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.game_id}#{self.seq}"
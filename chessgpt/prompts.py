@@ -0,0 +1,128 @@
+"""
+Prompts for asking OpenAI for the next move.
+
+The move prompt only describes the position: the FEN, a short SAN history and
+the legal moves grouped by origin square. The chat history is left out on
+purpose, since every move is already in it as a "X plays e2e4" row.
+"""
+
+import chess
+import json
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .governor import estimate_tokens
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:  ## Not installed, or the encoding couldn't be loaded.
+    _ENCODING = None
+
+SYSTEM_MOVE = "You are playing chess. Respond with your next move in UCI format, e.g. 'e2e4' or 'e7e8q'. No other text is allowed."
+
+SYSTEM_BATCH = (
+    "You are playing chess in several games at once. For each numbered position, choose your next move "
+    'in UCI format. Respond with a JSON object mapping position numbers to moves, e.g. {"1": "e2e4", "2": "e7e8q"}. '
+    "No other text is allowed."
+)
+
+## Number of half-moves shown in the SAN history.
+HISTORY_PLIES = 16
+
+
+class MovePrompt:
+    """Chat messages for a move request, with their token count."""
+
+    def __init__(self, messages: List[dict]):
+        self.messages = messages
+        self.tokens = count_tokens(messages)
+
+
+def build_move_prompt(
+    board: chess.Board,
+    history: Optional[List[str]] = None,
+    candidates: Optional[Iterable[chess.Move]] = None,
+) -> MovePrompt:
+    """Builds a position-only prompt. `history` lists the SAN of every move so far."""
+    return MovePrompt(
+        [
+            {"role": "system", "content": SYSTEM_MOVE},
+            {"role": "user", "content": describe_position(board, history, candidates)},
+        ]
+    )
+
+
+def build_batch_prompt(
+    positions: List[Tuple[chess.Board, Optional[List[str]], Optional[Iterable[chess.Move]]]]
+) -> MovePrompt:
+    """One prompt for several (board, history, candidates) positions; see `parse_batch_reply`."""
+    sections = [
+        f"Position {n}\n{describe_position(board, history, candidates)}"
+        for n, (board, history, candidates) in enumerate(positions, 1)
+    ]
+    return MovePrompt(
+        [
+            {"role": "system", "content": SYSTEM_BATCH},
+            {"role": "user", "content": "\n\n".join(sections)},
+        ]
+    )
+
+
+def parse_batch_reply(text: str) -> Dict[int, str]:
+    """Moves by position number from a batch reply. Raises ValueError if it isn't JSON."""
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError(f"No JSON object in reply: {text!r}")
+    moves = json.loads(text[start : end + 1])
+    return {int(n): str(move).strip() for n, move in moves.items()}
+
+
+def describe_position(
+    board: chess.Board,
+    history: Optional[List[str]] = None,
+    candidates: Optional[Iterable[chess.Move]] = None,
+) -> str:
+    """The FEN, recent moves and legal moves of a position."""
+    candidates = board.legal_moves if candidates is None else candidates
+    color = chess.COLOR_NAMES[board.turn].title()
+
+    lines = [f"FEN: {board.fen()}"]
+    if history:
+        lines.append(f"Moves: {format_history(history, board.ply())}")
+    lines.append(f"Legal ({color}, from:to): {format_moves(candidates)}")
+    return "\n".join(lines)
+
+
+def format_history(history: List[str], ply: int, plies: int = HISTORY_PLIES) -> str:
+    """Numbered SAN of the last few moves, e.g. '... 2.Nf3 Nc6 3.Bb5'."""
+    first = ply - len(history)
+    start = max(0, len(history) - plies)
+    text = "... " if start > 0 else ""
+
+    for n, san in enumerate(history[start:], first + start):
+        if n % 2 == 0:
+            text += f"{n // 2 + 1}.{san} "
+        elif n == first + start:
+            text += f"{n // 2 + 1}...{san} "
+        else:
+            text += f"{san} "
+
+    return text.strip()
+
+
+def format_moves(moves: Iterable[chess.Move]) -> str:
+    """Moves grouped by origin square, e.g. 'e2:e3,e4 g1:f3,h3 e7:e8q,e8n'."""
+    groups = {}
+    for move in moves:
+        uci = move.uci()
+        groups.setdefault(uci[:2], []).append(uci[2:])
+    return " ".join(f"{src}:{','.join(dst)}" for src, dst in groups.items())
+
+
+def count_tokens(messages: List[dict]) -> int:
+    """Token count of chat messages; exact when tiktoken is installed."""
+    if _ENCODING is None:
+        return estimate_tokens(messages)
+    return sum(4 + len(_ENCODING.encode(m.get("content") or "")) for m in messages) + 3
@@ -0,0 +1,83 @@
+"""
+Full-text search over chat history with SQLite FTS5.
+
+`chessgpt_chathistory_fts` is an external-content FTS5 table over
+`chessgpt_chathistory`, kept in sync by triggers (see migration 0009), so
+bulk inserts and deletes are indexed too.
+
+Archived games (see archive.py) have no hot chat rows, so `archive_game`
+copies their messages into `chessgpt_archivedchat_fts`, an FTS5 table that
+keeps its own content (see migration 0012). Searches cover both tables.
+"""
+
+import re
+
+from django.db import connection
+from typing import List
+
+FTS_TABLE = "chessgpt_chathistory_fts"
+ARCHIVE_TABLE = "chessgpt_archivedchat_fts"
+
+SEARCH_SQL = f"""
+    SELECT c.id, c.game_id, c.role, c.created,
+           snippet({FTS_TABLE}, 0, '[', ']', '...', 12) AS snippet,
+           bm25({FTS_TABLE}) AS rank
+    FROM {FTS_TABLE}
+    JOIN chessgpt_chathistory c ON c.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH %s
+    UNION ALL
+    SELECT a.chat_id, a.game_id, a.role, a.created,
+           snippet({ARCHIVE_TABLE}, 0, '[', ']', '...', 12),
+           bm25({ARCHIVE_TABLE})
+    FROM {ARCHIVE_TABLE} a
+    JOIN chessgpt_gamearchive g ON g.game_id = a.game_id
+    WHERE {ARCHIVE_TABLE} MATCH %s
+    ORDER BY rank
+    LIMIT %s OFFSET %s
+"""
+
+INDEX_ARCHIVED_SQL = f"""
+    INSERT INTO {ARCHIVE_TABLE} (content, chat_id, game_id, role, created)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+TERMS = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def match_query(text: str) -> str:
+    """Turns free text into an FTS5 query: every word or "quoted phrase" must match."""
+    terms = []
+    for phrase, word in TERMS.findall(text):
+        term = (phrase or word).replace('"', "")
+        if term:
+            terms.append(f'"{term}"')
+    return " AND ".join(terms)
+
+
+def search_chat(text: str, offset: int = 0, limit: int = 20) -> List[dict]:
+    """Chat messages matching the text, best matches first."""
+    query = match_query(text)
+    if not query:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL, [query, query, limit, offset])
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def index_archived(game_id: int, chats: List[dict]) -> None:
+    """Adds the messages of an archived game to the archive index."""
+    if connection.vendor != "sqlite":
+        return
+    rows = [
+        (chat["content"], chat["id"], game_id, chat["role"], _text(chat["created"]))
+        for chat in chats
+        if chat.get("id") is not None  ## Derived move lines aren't indexed when hot either.
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(INDEX_ARCHIVED_SQL, rows)
+
+
+def _text(created) -> str:
+    return created if isinstance(created, str) else created.isoformat()
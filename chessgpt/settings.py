@@ -125,3 +125,46 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Background tasks (see tasks.py)
+
+TASK_WORKERS = int(environ.get('TASK_WORKERS', 4))
+
+# Keep queued tasks and their results in the database across restarts.
+TASK_QUEUE_DURABLE = environ.get('TASK_QUEUE_DURABLE', '0') == '1'
+
+
+# OpenAI quota (see governor.py)
+
+OPENAI_REQUESTS_PER_MINUTE = int(environ.get('OPENAI_REQUESTS_PER_MINUTE', 3500))
+OPENAI_TOKENS_PER_MINUTE = int(environ.get('OPENAI_TOKENS_PER_MINUTE', 90000))
+OPENAI_CONCURRENCY = int(environ.get('OPENAI_CONCURRENCY', 8))
+OPENAI_MAX_RETRIES = int(environ.get('OPENAI_MAX_RETRIES', 5))
+
+
+# Greetings for /api/hello (see greetings.py)
+
+GREETING_POOL_SIZE = int(environ.get('GREETING_POOL_SIZE', 8))
+GREETING_POOL_LOW = int(environ.get('GREETING_POOL_LOW', 3))
+
+
+# Micro-batching of AI moves across games (see batching.py)
+# Suggestions arriving within the window share one OpenAI call; a size of 1
+# turns batching off. Use at least as many TASK_WORKERS as the batch size.
+
+SUGGEST_BATCH_SIZE = int(environ.get('SUGGEST_BATCH_SIZE', 1))
+SUGGEST_BATCH_WINDOW = float(environ.get('SUGGEST_BATCH_WINDOW', 0.05))
+
+# Moves offered to OpenAI, best first by the static evaluator (see
+# evaluator.py); 0 offers every legal move. Pruning needs numpy.
+
+SUGGEST_CANDIDATES = int(environ.get('SUGGEST_CANDIDATES', 12))
+
+
+# Append-only event log for moves (see gamelog.py)
+# Each move becomes a single insert; the game row is brought up to date
+# every GAME_SNAPSHOT_INTERVAL events and when the game ends.
+
+GAME_EVENT_LOG = environ.get('GAME_EVENT_LOG', '0') == '1'
+GAME_SNAPSHOT_INTERVAL = int(environ.get('GAME_SNAPSHOT_INTERVAL', 20))
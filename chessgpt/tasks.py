@@ -0,0 +1,192 @@
+"""
+In-process background task queue.
+
+Handlers run on a private asyncio loop in a daemon thread (the same trick the
+Arcade client uses in ChatGptApi), so a request can queue slow work, such as
+asking OpenAI for the next move, and return right away. Results are kept as
+`concurrent.futures.Future` objects that both sync and async code can wait on.
+
+With TASK_QUEUE_DURABLE enabled, every task is also recorded in the `Task`
+table, so results survive a restart and unfinished tasks are queued again.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import threading
+
+from collections import OrderedDict
+from django.conf import settings
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .models import Task
+
+LOG = logging.getLogger(__name__)
+
+TaskKey = Tuple[str, int, int]  ## (kind, game_id, ply)
+TaskHandler = Callable[[int, int], Awaitable[Optional[str]]]
+
+## Finished futures kept in memory for polling clients.
+MAX_RESULTS = 1024
+
+
+class TaskQueue:
+    """A pool of asyncio workers fed by an in-memory (optionally durable) queue."""
+
+    def __init__(self, workers: int = 4, durable: bool = False):
+        self.workers = workers
+        self.durable = durable
+        self.handlers: Dict[str, TaskHandler] = {}
+        self.futures: "OrderedDict[TaskKey, concurrent.futures.Future]" = OrderedDict()
+        self.loop: asyncio.AbstractEventLoop = None
+        self._queue: asyncio.Queue = None
+        self._lock = threading.Lock()
+
+    def handler(self, kind: str):
+        """Register a coroutine `handler(game_id, ply)` for a kind of task."""
+
+        def decorator(fn: TaskHandler) -> TaskHandler:
+            self.handlers[kind] = fn
+            return fn
+
+        return decorator
+
+    def start(self) -> None:
+        """Start the worker loop, if it isn't running yet."""
+        with self._lock:
+            if self.loop is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+
+            ## Start a new thread that will exit when the main thread ends (daemon=True)
+            threading.Thread(
+                target=self.loop.run_forever, daemon=True, name="TaskQueue"
+            ).start()
+
+        self._call(self._start_workers()).result()
+
+        if self.durable:
+            self.spawn(self._recover())
+
+    def spawn(self, coro: Awaitable) -> concurrent.futures.Future:
+        """Run a coroutine on the worker loop without queueing it."""
+        self.start()
+        return self._call(coro)
+
+    def submit(self, kind: str, game_id: int, ply: int) -> concurrent.futures.Future:
+        """Queue a task, unless the same task is already queued or succeeded."""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler for task: {kind}")
+
+        self.start()
+        key = (kind, game_id, ply)
+        with self._lock:
+            future = self.futures.get(key)
+            if future is not None and not (future.done() and future.exception()):
+                return future
+            future = concurrent.futures.Future()
+            self._remember(key, future)
+
+        self._call(self._enqueue(key, future))
+        return future
+
+    def get(self, kind: str, game_id: int, ply: int) -> Optional[concurrent.futures.Future]:
+        """Returns the future of a known task, or None."""
+        with self._lock:
+            return self.futures.get((kind, game_id, ply))
+
+    async def lookup(self, kind: str, game_id: int, ply: int) -> Optional[concurrent.futures.Future]:
+        """Like `get`, but falls back to the Task table when the queue is durable."""
+        future = self.get(kind, game_id, ply)
+        if future is not None or not self.durable:
+            return future
+
+        task = await Task.objects.filter(game_id=game_id, kind=kind, ply=ply).afirst()
+        if task is None or task.status not in ("done", "failed"):
+            return None
+
+        future = concurrent.futures.Future()
+        if task.status == "done":
+            future.set_result(task.result)
+        else:
+            future.set_exception(RuntimeError(task.result or "Task failed."))
+        with self._lock:
+            self._remember((kind, game_id, ply), future)
+        return future
+
+    ############################
+    # Worker loop
+    ############################
+
+    def _call(self, coro: Awaitable) -> concurrent.futures.Future:
+        ## Run in an empty context, so the workers don't inherit the caller's
+        ## request state (e.g. asgiref's thread-sensitive executor).
+        return contextvars.Context().run(
+            asyncio.run_coroutine_threadsafe, coro, self.loop
+        )
+
+    async def _start_workers(self):
+        self._queue = asyncio.Queue()
+        for n in range(self.workers):
+            self.loop.create_task(self._worker(n))
+
+    async def _enqueue(self, key: TaskKey, future: concurrent.futures.Future):
+        await self._save(key, "pending")
+        await self._queue.put((key, future))
+
+    async def _worker(self, n: int):
+        while True:
+            key, future = await self._queue.get()
+            kind, game_id, ply = key
+            LOG.debug(f"Worker {n} running {kind} for game {game_id} at ply {ply}")
+            try:
+                await self._save(key, "running")
+                result = await self.handlers[kind](game_id, ply)
+            except Exception as e:
+                LOG.exception(f"Task {kind} failed for game {game_id} at ply {ply}")
+                await self._save(key, "failed", str(e))
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                await self._save(key, "done", result)
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def _recover(self):
+        """Queue again the tasks that didn't finish before the last shutdown."""
+        pending = Task.objects.filter(status__in=["pending", "running"])
+        async for task in pending:
+            if task.kind in self.handlers:
+                self.submit(task.kind, task.game_id, task.ply)
+
+    async def _save(self, key: TaskKey, status: str, result: str = None):
+        if not self.durable:
+            return
+        kind, game_id, ply = key
+        try:
+            await Task.objects.aupdate_or_create(
+                game_id=game_id,
+                kind=kind,
+                ply=ply,
+                defaults={"status": status, "result": result},
+            )
+        except Exception as e:
+            LOG.error(f"Unable to save task {key}: {e}")
+
+    def _remember(self, key: TaskKey, future: concurrent.futures.Future):
+        """Store a future, forgetting the oldest finished ones. Caller holds the lock."""
+        self.futures[key] = future
+        while len(self.futures) > MAX_RESULTS:
+            oldest, old = next(iter(self.futures.items()))
+            if not old.done():
+                break
+            del self.futures[oldest]
+
+
+queue = TaskQueue(
+    workers=settings.TASK_WORKERS,
+    durable=settings.TASK_QUEUE_DURABLE,
+)
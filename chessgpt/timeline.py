@@ -0,0 +1,140 @@
+"""
+Every position of a game, in one compact response.
+
+NDJSON (application/x-ndjson) has a header line, then one line per move with
+the position after it:
+
+    {"game": 1, "moves": 2}
+    [0, "e2e4", "e4", "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"]
+    [1, "e7e5", "e5", "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2"]
+
+The binary format (application/x-chessgpt-timeline) is little-endian: the
+magic b"CGTL", a version byte and a uint32 record count, followed by 38-byte
+records:
+
+    uint16  ply
+    uint16  move: from | to << 6 | promotion piece type << 12 (0 if unknown)
+    32s     board: one nibble per square (a1 = low nibble of byte 0),
+            0 = empty, 1-6 = white PNBRQK, 9-14 = black PNBRQK
+    uint8   flags: bit 0 = white to move, bits 1-4 = castling KQkq
+    int8    en passant square, or -1
+
+Responses are cached per game and format until the next move is committed.
+"""
+
+import chess
+import json
+import struct
+
+from django.core.cache import cache
+from typing import Iterator, List, Optional, Tuple
+
+NDJSON = "application/x-ndjson"
+BINARY = "application/x-chessgpt-timeline"
+
+MAGIC = b"CGTL"
+VERSION = 1
+HEADER = struct.Struct("<4sBI")
+RECORD = struct.Struct("<HH32sBb")
+
+CASTLING = [chess.BB_H1, chess.BB_A1, chess.BB_H8, chess.BB_A8]  ## K, Q, k, q
+
+
+def positions(moves: List[dict]) -> Iterator[Tuple[dict, Optional[chess.Move], chess.Board]]:
+    """Yields each move, the move it replays as (None if unknown) and the board after it."""
+    board = None
+    for move in moves:
+        if board is None and move["ply"] == 0:
+            board = chess.Board()
+        played = parse_move(board, move["uci"]) if board is not None else None
+        if played is not None:
+            board.push(played)
+        if played is None or board.board_fen() != move["fen"].split()[0]:
+            board = chess.Board(move["fen"])  ## Trust the stored position.
+            played = None
+        yield move, played, board
+
+
+def parse_move(board: chess.Board, text: str) -> Optional[chess.Move]:
+    """The legal move in UCI or SAN (older rows keep the move as it was sent), or None."""
+    try:
+        move = chess.Move.from_uci(text)
+        return move if move in board.legal_moves else None
+    except ValueError:
+        try:
+            return board.parse_san(text)
+        except ValueError:
+            return None
+
+
+def render_ndjson(game_id: int, moves: List[dict]) -> bytes:
+    lines = [json.dumps({"game": game_id, "moves": len(moves)}, separators=(",", ":"))]
+    for move, played, _ in positions(moves):
+        uci = played.uci() if played is not None else move["uci"]
+        row = [move["ply"], uci, move["san"], move["fen"]]
+        lines.append(json.dumps(row, separators=(",", ":")))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def render_binary(game_id: int, moves: List[dict]) -> bytes:
+    chunks = [HEADER.pack(MAGIC, VERSION, len(moves))]
+    for move, played, board in positions(moves):
+        chunks.append(
+            RECORD.pack(
+                move["ply"],
+                pack_move(played) if played is not None else 0,
+                pack_board(board),
+                pack_flags(board),
+                -1 if board.ep_square is None else board.ep_square,
+            )
+        )
+    return b"".join(chunks)
+
+
+def pack_move(move: chess.Move) -> int:
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def pack_board(board: chess.Board) -> bytes:
+    nibbles = [0] * 64
+    for square, piece in board.piece_map().items():
+        nibbles[square] = piece.piece_type | (0 if piece.color else 8)
+    return bytes(nibbles[i] | nibbles[i + 1] << 4 for i in range(0, 64, 2))
+
+
+def pack_flags(board: chess.Board) -> int:
+    flags = int(board.turn)
+    for bit, rook in enumerate(CASTLING, 1):
+        if board.castling_rights & rook:
+            flags |= 1 << bit
+    return flags
+
+
+RENDERERS = {NDJSON: render_ndjson, BINARY: render_binary}
+
+
+def negotiate(accept: str) -> str:
+    """Picks the format from an Accept header; NDJSON unless binary is preferred."""
+    for media in (accept or "").split(","):
+        media = media.split(";")[0].strip()
+        if media in (BINARY, "application/octet-stream"):
+            return BINARY
+        if media in (NDJSON, "application/json", "*/*"):
+            return NDJSON
+    return NDJSON
+
+
+def render(game_id: int, stamp: str, content_type: str, load_moves) -> bytes:
+    """Rendered timeline, from the cache when the game hasn't changed since `stamp`."""
+    key = f"timeline:{game_id}:{content_type}"
+    cached = cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    body = RENDERERS[content_type](game_id, load_moves())
+    cache.set(key, (stamp, body))
+    return body
+
+
+def invalidate(game_id: int) -> None:
+    cache.delete_many([f"timeline:{game_id}:{fmt}" for fmt in RENDERERS])
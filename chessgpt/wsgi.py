@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chessgpt.settings')
 
 application = get_wsgi_application()
+
+## Start filling the greeting pool, as asgi.py does (runserver loads this module).
+from chessgpt import greetings
+
+greetings.pool.refill()
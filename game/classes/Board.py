@@ -3,10 +3,13 @@ import chess
 import logging
 import math
 
-from typing import List
+from typing import Dict, List, Set
 from arcade import NamedPoint, Color, SpriteSolidColor
 
+from classes.Overlay import Overlay
 from classes.Piece import Piece
+from classes.RotatingSprite import rotate_all
+from classes.TextureRegistry import TEXTURES
 from classes.EventSource import EventSource
 
 LOG = logging.getLogger(__name__)
@@ -29,8 +32,11 @@ TEXT_COLOR: Color = arcade.color.WHITE
 
 ROTATE_SPEED = 135  ## degrees per second
 ALPHA_SPEED = 127  ## alpha per second
+MAX_STEP = 1 / 30  ## longest animation step, in seconds (e.g. the first frame after idling)
 PIECE_SPEED = 10  ## pixels per second
 
+BLEND_COPY = (arcade.gl.ONE, arcade.gl.ZERO)
+
 NO_SPRITES = arcade.SpriteList()
 NO_SQUARES = chess.SquareSet()
 
@@ -47,21 +53,43 @@ class Board(arcade.Shape):
         """Creates a new board with the given FEN string."""
 
         # Create the board background
-        self.texture = arcade.load_texture("assets/board.jpg")
+        self.texture = TEXTURES.board
         self.scale = BOARD_WIDTH / self.texture.width
+        self.background = TEXTURES.sprite_list(capacity=1)
+        self.background.append(
+            arcade.Sprite(
+                texture=self.texture,
+                scale=self.scale,
+                center_x=center.x,
+                center_y=center.y,
+            )
+        )
+
+        ## Background, squares and labels, rendered once while nothing moves.
+        self._layer = arcade.Texture.create_empty(
+            f"board-layer-{id(self)}", (BOARD_WIDTH, BOARD_WIDTH)
+        )
+        self._layers = arcade.SpriteList(
+            atlas=arcade.TextureAtlas((BOARD_WIDTH + 2, BOARD_WIDTH + 2)), capacity=1
+        )
+        self._layers.append(
+            arcade.Sprite(texture=self._layer, center_x=center.x, center_y=center.y)
+        )
+        self._layer_stale = True
 
         ## Static sprites.
         self.chess_board: chess.Board = None
         self.squares: arcade.ShapeElementList = arcade.ShapeElementList()
         self.labels: arcade.SpriteList[arcade.Sprite] = NO_SPRITES
+        self._label_sets: Dict[chess.Color, arcade.SpriteList] = {}
         self.pieces: arcade.SpriteList[Piece] = NO_SPRITES
-        self._highlights: arcade.SpriteList[arcade.Sprite] = NO_SPRITES
-        self._warnings: arcade.SpriteList[arcade.Sprite] = NO_SPRITES
-        self._checkers: arcade.SpriteList[arcade.Sprite] = NO_SPRITES
+        self._squares: List[Piece] = [None] * 64  ## Piece sprites by square.
 
-        ## Highlighted squares are stored in the extra property.
-        self._highlights.extra = NO_SQUARES
-        self._warnings.extra = NO_SQUARES
+        ## Legal moves of the current position, built on first use.
+        self._legal: Set[chess.Move] = None
+        self._destinations: Dict[chess.Square, chess.SquareSet] = None
+        self._attackers: Dict[chess.Square, chess.SquareSet] = {}
+        self._checkers: arcade.SpriteList[arcade.Sprite] = NO_SPRITES
 
         ## Board will rotate until it reaches the target angle.
         self.perspective = chess.WHITE
@@ -81,6 +109,32 @@ class Board(arcade.Shape):
         self.on_board_undo = EventSource("on_board_undo")
         self.on_board_reset = EventSource("on_board_reset")
 
+        ## Overlays, with their text rendered once.
+        self._status_textures: Dict[str, arcade.Texture] = {}
+        self._highlights = Overlay(
+            [
+                SpriteSolidColor(SQUARE_SIZE, SQUARE_SIZE, arcade.color.YELLOW)
+                for _ in chess.SQUARES
+            ],
+            [
+                self._create_text_sprite(
+                    chess.square_name(square), CENTER_PT, arcade.color.BLACK
+                )
+                for square in chess.SQUARES
+            ],
+            alpha=127,
+        )
+        self._warnings = Overlay(
+            [
+                arcade.SpriteCircle(SQUARE_SIZE // 2, arcade.color.RED, True)
+                for _ in chess.SQUARES
+            ],
+            [
+                arcade.Sprite(texture=self._status_texture("check"))
+                for _ in chess.SQUARES
+            ],
+        )
+
     def start(self, fen):
         """The board isn't visible until you start a game."""
         if self.chess_board is None:
@@ -91,11 +145,13 @@ class Board(arcade.Shape):
             self.chess_board.set_fen(fen)
             self.set_perspective(self.chess_board.turn)
 
+        self.position_changed()
         self.update_pieces()
         self.update_warnings()
         self.update_highlights()
 
     def create_board(self):
+        self._layer_stale = True
         self.squares = arcade.ShapeElementList()
         self.squares.center_x = self.center.x
         self.squares.center_y = self.center.y
@@ -126,101 +182,94 @@ class Board(arcade.Shape):
                 color_index += 1
 
     def create_labels(self):
-        self.labels = arcade.SpriteList()
-        margin = BOARD_MARGIN / 2
+        """Shows the rank and file labels for the current perspective."""
+        self._layer_stale = True
+        if not self._label_sets:
+            ## Text is slow to render, so both sets are made once, up front.
+            self._label_sets = {
+                color: self._render_labels(color) for color in chess.COLORS
+            }
+
+        self.labels = self._label_sets[self.perspective]
+        for sprite in self.labels:
+            sprite.alpha = self.alpha
 
         self.target_alpha = 255
 
-        for x in range(0, 8):
-            center = x * SQUARE_SIZE + SQUARE_CENTER
-            if self.perspective == chess.BLACK:
-                x = 7 - x
-
-            self.labels.append(
-                self._create_text_sprite(
-                    str(x + 1),
-                    NamedPoint(self.origin.x - margin, self.origin.y + center),
-                    TEXT_COLOR,
-                )
-            )
-
-            self.labels.append(
-                self._create_text_sprite(
-                    str(chr(x + 65)),
-                    NamedPoint(self.origin.x + center, self.origin.y - margin),
-                    TEXT_COLOR,
-                )
-            )
-
     def update_pieces(self):
-        """Recreates the pieces according to the current board state."""
-        self.pieces = arcade.SpriteList()
-        for square, piece in self.chess_board.piece_map().items():
-            self.pieces.append(
-                Piece(
-                    piece,
-                    square,
-                    self.center,
-                    self.offset_of(square),
-                )
-            )
+        """Updates the piece sprites to match the board state, reusing sprites."""
+        if self.pieces is NO_SPRITES:
+            self.pieces = TEXTURES.sprite_list()
 
-        if self.angle > 0:
-            angle_rad = math.radians(self.angle)
-            for sprite in self.pieces:
-                sprite.rotate(angle_rad)
+        target = self.chess_board.piece_map()
+        stale: List[Piece] = []
+        for sprite in self.pieces:
+            if target.get(sprite.square) == sprite.piece:
+                del target[sprite.square]  ## Already in place.
+            else:
+                stale.append(sprite)
+                if self._squares[sprite.square] is sprite:
+                    self._squares[sprite.square] = None
+
+        angle_rad = math.radians(self.angle) if self.angle > 0 else 0
+
+        for square, piece in target.items():
+            ## Move the nearest sprite of the same piece, or promote a pawn.
+            sprite = self._nearest(stale, square, piece) or self._nearest(
+                stale, square, chess.Piece(chess.PAWN, piece.color)
+            )
+            if sprite is None:
+                sprite = Piece(piece, square, self.center, self.offset_of(square))
+                self.pieces.append(sprite)
+            else:
+                stale.remove(sprite)
+                if sprite.piece != piece:
+                    sprite.set_piece(piece)
+            sprite.place(square, self.offset_of(square), angle_rad)
+            self._squares[square] = sprite
+
+        ## Whatever is left was captured.
+        for sprite in stale:
+            self.pieces.remove(sprite)
 
     def update_highlights(self, squares: chess.SquareSet = NO_SQUARES):
-        self._highlights = arcade.SpriteList() if len(squares) > 0 else NO_SPRITES
-        self._highlights.extra = squares
-
-        for square in list(squares):
-            solid = SpriteSolidColor(SQUARE_SIZE, SQUARE_SIZE, arcade.color.YELLOW)
-            solid.position = self.center_of(square)
-            solid.alpha = 127
-            self._highlights.append(solid)
-            self._highlights.append(
-                self._create_text_sprite(
-                    chess.square_name(square),
-                    NamedPoint(solid.position[0], solid.position[1]),
-                    arcade.color.BLACK,
-                )
-            )
+        self._highlights.show(squares, self.center_of, text_alpha=int(self.alpha))
 
     def update_warnings(
         self,
         squares: chess.SquareSet = NO_SQUARES,
         text: str = "",
     ):
-        self._warnings = arcade.SpriteList() if len(squares) > 0 else NO_SPRITES
-        self._warnings.extra = squares
-
-        for square in list(squares):
-            solid = arcade.SpriteCircle(SQUARE_SIZE // 2, arcade.color.RED, True)
-            solid.position = self.center_of(square)
-            self._warnings.append(solid)
-            self._warnings.append(
-                self._create_text_sprite(
-                    text,
-                    NamedPoint(solid.position[0], solid.position[1]),
-                    arcade.color.BLACK,
-                )
-            )
+        if text:
+            self._warnings.show(squares, self.center_of, self._status_texture(text))
+        else:
+            self._warnings.show(squares, self.center_of, text_alpha=0)
 
     def update(self, delta_time: float):
-        self.rotate_board()
-        self.animate_alpha()
+        delta_time = min(delta_time, MAX_STEP)
+        self.rotate_board(delta_time)
+        self.animate_alpha(delta_time)
 
     def draw(self):
-        self.texture.draw_scaled(
-            self.center.x, self.center.y, self.scale, self.squares.angle
-        )
-        self.squares.draw()
-        self.labels.draw()
+        if self.animating:
+            self._draw_layers()
+            self._layer_stale = True
+        else:
+            if self._layer_stale:
+                self._render_layers()
+            ## The background is opaque, so copy the layer as is: blending
+            ## would apply the alpha it picked up from the translucent squares.
+            self._layers.draw(pixelated=True, blend_function=BLEND_COPY)
+
         self._highlights.draw()
         self.pieces.draw()
         self._warnings.draw()
 
+    @property
+    def animating(self) -> bool:
+        """Whether the board is rotating or fading its labels."""
+        return self.angle < self.target_angle or self.alpha != self.target_alpha
+
     @property
     def width(self) -> int:
         return BOARD_WIDTH
@@ -263,8 +312,8 @@ class Board(arcade.Shape):
 
     def square_at(self, x: int, y: int) -> chess.Square:
         """Returns the square at the given screen coordinates."""
-        file = (x - self.origin.x) // SQUARE_SIZE
-        rank = (y - self.origin.y) // SQUARE_SIZE
+        file = int((x - self.origin.x) // SQUARE_SIZE)
+        rank = int((y - self.origin.y) // SQUARE_SIZE)
 
         if file < 0 or rank < 0 or file > 7 or rank > 7:
             return None
@@ -279,20 +328,18 @@ class Board(arcade.Shape):
     # Perspective
     ############################
 
-    def rotate_board(self):
-        """Rotates the board and pieces by the given angle."""
-        if self.angle == self.target_angle:
+    def rotate_board(self, delta_time: float):
+        """Turns the board and pieces toward the target angle."""
+        if self.angle >= self.target_angle:
             return
 
-        if self.angle < self.target_angle:
-            self.angle += ROTATE_SPEED / 60  ## FPS
+        self.angle = min(self.target_angle, self.angle + ROTATE_SPEED * delta_time)
 
         LOG.debug(f"Rotating board to {self.angle} degrees")
 
         self.squares.angle = self.angle
-        angle_rad = math.radians(self.angle)
-        for sprite in self.pieces:
-            sprite.rotate(angle_rad)
+        self.background[0].angle = self.angle
+        rotate_all(self.pieces, math.radians(self.angle))
 
     def set_perspective(self, player=chess.WHITE) -> None:
         """Sets the perspective of the board to the given player."""
@@ -304,6 +351,8 @@ class Board(arcade.Shape):
         ][self.perspective]
         self.perspective = player
         self.target_alpha = 0
+        if self.alpha == 0:
+            self.create_labels()  ## Already faded out.
 
     def toggle_perspective(self) -> None:
         """Swaps the perspective of the board."""
@@ -316,6 +365,7 @@ class Board(arcade.Shape):
     def update_fen(self, fen: str) -> None:
         """Updates the board with the given FEN string."""
         self.chess_board = chess.Board(fen)
+        self.position_changed()
         self.update_pieces()
         self.update_warnings()
         self.update_highlights()
@@ -337,6 +387,7 @@ class Board(arcade.Shape):
         player = self.chess_board.turn
         promotion = chess.QUEEN if self.is_promotion(piece, square) else None
         self.chess_board.push(chess.Move(piece.square, square, promotion))
+        self.position_changed()
         self.set_perspective(self.chess_board.turn)
         self.update_pieces()
 
@@ -364,19 +415,41 @@ class Board(arcade.Shape):
 
     def piece_at(self, square: chess.Square) -> Piece:
         """Returns the piece at the given square, or None."""
-        return next(filter(lambda sprite: sprite.square == square, self.pieces), None)
+        return None if square is None else self._squares[square]
+
+    def sprite_at(self, x: int, y: int) -> Piece:
+        """Returns the piece at the given screen coordinates, or None."""
+        return self.piece_at(self.square_at(x, y))
 
     def is_valid_move(self, piece: Piece, square: chess.Square) -> bool:
         """Returns True if the given move is valid."""
-        return self.chess_board.is_legal(chess.Move(piece.square, square))
-
-    def legal_moves(self, piece: Piece) -> List[chess.Square]:
-        """Returns a list of legal moves for the given piece."""
-        return [
-            move.to_square
-            for move in self.chess_board.legal_moves
-            if move.from_square == piece.square
-        ]
+        if square is None:
+            return False
+        promotion = chess.QUEEN if self.is_promotion(piece, square) else None
+        self._build_move_map()
+        return chess.Move(piece.square, square, promotion) in self._legal
+
+    def legal_moves(self, piece: Piece) -> chess.SquareSet:
+        """Returns the squares the given piece can move to."""
+        self._build_move_map()
+        return self._destinations.get(piece.square, NO_SQUARES)
+
+    def position_changed(self) -> None:
+        """Drops the move map and attackers. Call after every push, pop or new FEN."""
+        self._legal = None
+        self._destinations = None
+        self._attackers = {}
+
+    def _build_move_map(self) -> None:
+        if self._legal is not None:
+            return
+        ## Promotions to every piece are kept, so each variant validates.
+        self._legal = set(self.chess_board.legal_moves)
+        self._destinations = {}
+        for move in self._legal:
+            if move.from_square not in self._destinations:
+                self._destinations[move.from_square] = chess.SquareSet()
+            self._destinations[move.from_square].add(move.to_square)
 
     def undo_move(self) -> None:
         """Undoes the last move and resets perspective."""
@@ -384,17 +457,34 @@ class Board(arcade.Shape):
             return
 
         removed = self.chess_board.pop()
+        self.position_changed()
         self.set_perspective(self.chess_board.turn)
-        self.on_board_undo(player=self.chess_board.turn, move=removed.uci())
+        self.update_pieces()
+        self.update_warnings()
+        self.on_board_undo(self.chess_board.turn, removed.uci())
 
-    def show_attackers_of(self, x: int, y: int) -> None:
-        """Highlights all squares that threaten the given square."""
+    def show_attackers_of(self, x: int, y: int, piece: Piece = None) -> None:
+        """Highlights all squares that threaten the given square.
+
+        With a piece, only squares it can move to are considered."""
         square = self.square_at(x, y)
-        if square in self._warnings.extra:
+        if square is not None and square in self._warnings.squares:
+            return
+
+        if square is None or piece is not None and square not in self.legal_moves(piece):
+            if self._warnings.squares:
+                self.update_warnings()
             return
 
-        attackers = self.chess_board.attackers(not self.chess_board.turn, square)
-        self.update_warnings(attackers, "threat")
+        self.update_warnings(self.attackers_of(square), "threat")
+
+    def attackers_of(self, square: chess.Square) -> chess.SquareSet:
+        """Opponent pieces attacking the square, cached until the position changes."""
+        if square not in self._attackers:
+            self._attackers[square] = self.chess_board.attackers(
+                not self.chess_board.turn, square
+            )
+        return self._attackers[square]
 
     ############################
     # Highlights
@@ -406,7 +496,7 @@ class Board(arcade.Shape):
 
         # Remove highlight, if no square is selected.
         if square is None:
-            if len(self._highlights) > 0:
+            if self._highlights.squares:
                 self.update_highlights()
             return
 
@@ -418,7 +508,7 @@ class Board(arcade.Shape):
 
     def get_highlights(self) -> List[chess.Square]:
         """Returns a list of highlighted squares."""
-        return self._highlights.extra
+        return self._highlights.squares
 
     def set_highlights(self, value: List[chess.Square]) -> None:
         """Sets the highlighted squares."""
@@ -430,14 +520,15 @@ class Board(arcade.Shape):
     # Fade In/Out
     ############################
 
-    def animate_alpha(self):
+    def animate_alpha(self, delta_time: float):
+        """Fades the labels toward the target alpha."""
         if self.alpha == self.target_alpha:
             return
 
         if self.alpha < self.target_alpha:
-            self.alpha += ALPHA_SPEED / 60  ## FPS
+            self.alpha += ALPHA_SPEED * delta_time
         else:
-            self.alpha -= ALPHA_SPEED / 60  ## FPS
+            self.alpha -= ALPHA_SPEED * delta_time
 
         self.alpha = max(0, min(self.target_alpha, self.alpha))
 
@@ -453,11 +544,69 @@ class Board(arcade.Shape):
     # Private methods
     ############################
 
+    def _render_labels(self, perspective: chess.Color) -> arcade.SpriteList:
+        labels = arcade.SpriteList()
+        margin = BOARD_MARGIN / 2
+
+        for x in range(0, 8):
+            center = x * SQUARE_SIZE + SQUARE_CENTER
+            if perspective == chess.BLACK:
+                x = 7 - x
+
+            labels.append(
+                self._create_text_sprite(
+                    str(x + 1),
+                    NamedPoint(self.origin.x - margin, self.origin.y + center),
+                    TEXT_COLOR,
+                )
+            )
+
+            labels.append(
+                self._create_text_sprite(
+                    str(chr(x + 65)),
+                    NamedPoint(self.origin.x + center, self.origin.y - margin),
+                    TEXT_COLOR,
+                )
+            )
+
+        return labels
+
+    def _draw_layers(self):
+        self.background.draw()
+        self.squares.draw()
+        self.labels.draw()
+
+    def _render_layers(self):
+        """Renders the static layers into the layer texture."""
+        x, y = self.center.x, self.center.y
+        projection = (x - BOARD_CENTER, x + BOARD_CENTER, y - BOARD_CENTER, y + BOARD_CENTER)
+        with self._layers.atlas.render_into(self._layer, projection) as framebuffer:
+            framebuffer.clear()
+            self._draw_layers()
+        self._layer_stale = False
+
+    def _nearest(
+        self, sprites: List[Piece], square: chess.Square, piece: chess.Piece
+    ) -> Piece:
+        """The sprite of the given piece closest to the square, or None."""
+        matches = [sprite for sprite in sprites if sprite.piece == piece]
+        return min(
+            matches,
+            key=lambda sprite: chess.square_distance(sprite.square, square),
+            default=None,
+        )
+
     def _create_square(self, center: NamedPoint, color: Color):
         return arcade.create_rectangle_filled(
             center.x, center.y, SQUARE_SIZE, SQUARE_SIZE, color
         )
 
+    def _status_texture(self, text: str) -> arcade.Texture:
+        if text not in self._status_textures:
+            sprite = self._create_text_sprite(text, CENTER_PT, arcade.color.BLACK)
+            self._status_textures[text] = sprite.texture
+        return self._status_textures[text]
+
     def _create_text_sprite(
         self,
         text: str,
@@ -1,5 +1,7 @@
 import aiohttp
 import asyncio
+import json
+import logging
 import threading
 
 from classes.EventSource import EventSource
@@ -11,6 +13,13 @@ API_POST_CREATE_GAME = "/api/chess"
 API_POST_SAVE_MOVE = "/api/chess/{id}/move/{move}"
 API_GET_SUGGEST_MOVE = "/api/chat/{id}/suggest"
 API_GET_CHAT = "/api/chat/{id}?message={message}"
+API_POST_QUEUE_SUGGESTION = "/api/chess/{id}/suggestion"
+API_GET_EVENTS = "/api/chess/{id}/events"
+
+EVENTS_READ_TIMEOUT = 45  ## seconds; the server pings every 15 seconds
+EVENTS_MAX_RETRIES = 5
+
+LOG = logging.getLogger(__name__)
 
 
 class ApiError:
@@ -33,6 +42,12 @@ class ApiGameCreated:
         return self.data["fen"]
 
 
+class ApiEvent:
+    def __init__(self, name: str, data: dict):
+        self.name = name
+        self.data = data
+
+
 class ApiMove:
     def __init__(self, data: dict):
         self.data = data
@@ -69,6 +84,14 @@ class ApiMove:
 class ChatGptApi(object):
     def __init__(self):
         self.game_data: ApiGameCreated = None
+        self.ply = 0
+
+        ## Pushed events: None while connecting, False if the server can't stream.
+        self.streaming: bool = None
+        self._listener = None
+        self._awaiting_suggestion = False
+        self._pending_suggestion = None  ## (ply, move) pushed before it was requested
+        self._delivered_ply = -1
 
         self.loop = asyncio.new_event_loop()
 
@@ -83,6 +106,7 @@ class ChatGptApi(object):
         self.on_api_suggest = EventSource("on_api_suggest")
         self.on_api_chat = EventSource("on_api_chat")
         self.on_api_created = EventSource("on_api_created")
+        self.on_api_event = EventSource("on_api_event")
 
     @property
     def id(self) -> int:
@@ -109,8 +133,16 @@ class ChatGptApi(object):
 
     def _save_game(self, data):
         self.game_data = ApiGameCreated(data)
+        self.ply = self._ply_of(self.game_data.fen)
+        self._pending_suggestion = None
+        self._delivered_ply = -1
+        self.subscribe()
         self.on_api_created(self.game_data)
 
+    def _ply_of(self, fen: str) -> int:
+        fields = fen.split()
+        return (int(fields[5]) - 1) * 2 + (fields[1] == "b")
+
     def make_move(self, move: str):
         """Make a move in the game"""
         asyncio.run_coroutine_threadsafe(self._make_move(move), self.loop)
@@ -119,12 +151,36 @@ class ChatGptApi(object):
         await self._invoke(
             "post",
             API_POST_SAVE_MOVE.format(id=self.id, move=move),
-            lambda data: self.on_api_moved(ApiMove(data)),
+            self._save_move,
         )
 
+    def _save_move(self, data):
+        move = ApiMove(data)
+        self.ply = move.ply + 1
+        self.on_api_moved(move)
+
     def suggest_move(self):
         """Suggest a move in the game"""
-        asyncio.run_coroutine_threadsafe(self._suggest_move(), self.loop)
+        asyncio.run_coroutine_threadsafe(self._request_suggestion(), self.loop)
+
+    async def _request_suggestion(self):
+        if self.streaming is False:
+            await self._suggest_move()
+            return
+
+        ## The suggestion may already have been pushed.
+        pending = self._pending_suggestion
+        if pending is not None and pending[0] == self.ply:
+            self._deliver_suggestion(*pending)
+            return
+
+        ## Otherwise queue it; the result is pushed when it's ready.
+        self._awaiting_suggestion = True
+        await self._invoke(
+            "post",
+            API_POST_QUEUE_SUGGESTION.format(id=self.id),
+            self._on_suggestion,
+        )
 
     async def _suggest_move(self):
         await self._invoke(
@@ -133,6 +189,87 @@ class ChatGptApi(object):
             self.on_api_suggest,
         )
 
+    def _on_suggestion(self, data: dict):
+        if data.get("status", "done") != "done" or not data.get("move"):
+            return
+        ply = data["ply"]
+        if ply < self.ply or ply == self._delivered_ply:
+            return
+        if self._awaiting_suggestion and ply == self.ply:
+            self._deliver_suggestion(ply, data["move"])
+        else:
+            self._pending_suggestion = (ply, data["move"])
+
+    def _deliver_suggestion(self, ply: int, move: str):
+        self._awaiting_suggestion = False
+        self._pending_suggestion = None
+        self._delivered_ply = ply
+        self.on_api_suggest(move)
+
+    ############################
+    # Pushed events
+    ############################
+
+    def subscribe(self):
+        """Listen for events of the current game on one persistent connection"""
+        if self._listener is not None:
+            self._listener.cancel()
+        self.streaming = None
+        self._listener = asyncio.run_coroutine_threadsafe(
+            self._listen(self.id), self.loop
+        )
+
+    async def _listen(self, game_id: int):
+        url = API_BASEURL + API_GET_EVENTS.format(id=game_id)
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=EVENTS_READ_TIMEOUT)
+        retries = 0
+
+        while self.id == game_id and retries <= EVENTS_MAX_RETRIES:
+            try:
+                async with aiohttp.ClientSession(timeout=timeout) as session:
+                    async with session.get(url) as response:
+                        if response.status != 200:
+                            break  ## The server can't stream, so don't retry.
+                        self.streaming = True
+                        retries = 0
+                        await self._read_events(response)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                LOG.info(f"Event stream for game {game_id} interrupted: {e}")
+
+            self.streaming = None
+            retries += 1
+            await asyncio.sleep(min(30, 2**retries))
+
+        if self.id == game_id:
+            self.streaming = False
+            if self._awaiting_suggestion:
+                self._awaiting_suggestion = False
+                await self._suggest_move()
+
+    async def _read_events(self, response: aiohttp.ClientResponse):
+        """Parse a text/event-stream body."""
+        event, data = None, []
+        async for raw in response.content:
+            line = raw.decode().rstrip("\r\n")
+            if line == "":
+                if event and data:
+                    self._dispatch(event, json.loads("\n".join(data)))
+                event, data = None, []
+            elif line.startswith(":"):
+                continue  ## Comment or keep-alive.
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
+
+    def _dispatch(self, event: str, data: dict):
+        if event == "ai-move":
+            self._on_suggestion(data)
+        else:
+            self.on_api_event(ApiEvent(event, data))
+
     def chat(self, message: str):
         """Send a message in the game"""
         asyncio.run_coroutine_threadsafe(self._chat(message), self.loop)
@@ -150,7 +287,7 @@ class ChatGptApi(object):
                 async with session.request(
                     method, API_BASEURL + url, json=json
                 ) as response:
-                    if response.status == 200:
+                    if response.status in (200, 202):
                         if response.content_type == "application/json":
                             data = await response.json()
                             callback(data)
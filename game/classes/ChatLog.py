@@ -0,0 +1,100 @@
+import arcade
+import arcade.gui
+import pyglet
+
+from collections import deque
+from typing import Deque, NamedTuple
+
+from arcade.gui import UIMouseScrollEvent
+
+## Roles, as the API names them.
+ROLE_USER = "user"
+ROLE_ASSISTANT = "assistant"
+ROLE_SYSTEM = "system"
+
+ROLE_COLORS = {
+    ROLE_USER: arcade.color.LIGHT_SKY_BLUE,
+    ROLE_ASSISTANT: arcade.color.WHITE,
+    ROLE_SYSTEM: arcade.color.LIGHT_GRAY,
+}
+
+## Messages kept; older ones are dropped.
+CHAT_LOG_SIZE = 500
+
+
+class ChatMessage(NamedTuple):
+    role: str
+    text: str
+
+
+class ChatLog(arcade.gui.UITextArea):
+    """A chat area showing the newest messages first, colored by role.
+
+    Messages live in a ring buffer, and only a page of them (as many as could
+    possibly fit) is laid out. Scrolling moves through messages, not pixels.
+    """
+
+    def __init__(self, *args, font_name=("Arial",), font_size: float = 12, **kwargs):
+        super().__init__(*args, font_name=font_name, font_size=font_size, **kwargs)
+        self.messages: Deque[ChatMessage] = deque(maxlen=CHAT_LOG_SIZE)
+        self.first = 0  ## Index of the message shown at the top.
+        self.font_name = font_name
+        self.font_size = font_size
+
+        self.doc = pyglet.text.document.FormattedDocument()
+        self.layout.document = self.doc
+
+    @property
+    def page_size(self) -> int:
+        """Messages that could fit at once: each takes a line, plus a blank one."""
+        font = pyglet.font.load(self.font_name, self.font_size)
+        line = font.ascent - font.descent
+        return int(self.height // (2 * line)) + 1
+
+    def append(self, role: str, text: str) -> None:
+        """Adds a message at the top."""
+        self.messages.appendleft(ChatMessage(role, text))
+        if self.first > 0:
+            ## Keep the view on the same messages while scrolled back.
+            self.first = min(self.first + 1, len(self.messages) - 1)
+        else:
+            self.render_page()
+
+    def scroll(self, messages: int) -> None:
+        """Scrolls toward older (positive) or newer (negative) messages."""
+        first = max(0, min(self.first + messages, len(self.messages) - 1))
+        if first != self.first:
+            self.first = first
+            self.render_page()
+
+    def render_page(self) -> None:
+        """Lays out the visible page of messages only."""
+        end = min(len(self.messages), self.first + self.page_size)
+
+        ## Fill a detached document, so it is laid out once, when attached.
+        doc = pyglet.text.document.FormattedDocument()
+        for n in range(self.first, end):
+            message = self.messages[n]
+            text = message.text if n == end - 1 else f"{message.text}\n\n"
+            doc.insert_text(len(doc.text), text, self._style(message.role))
+
+        self.doc = doc
+        self.layout.document = doc
+
+        self.trigger_full_render()
+
+    def on_event(self, event) -> bool:
+        if isinstance(event, UIMouseScrollEvent):
+            if self.rect.collide_with_point(event.x, event.y):
+                ## Wheel up shows newer messages, one per click.
+                self.scroll(-1 if event.scroll_y > 0 else 1)
+                return True
+        return super().on_event(event)
+
+    def _style(self, role: str) -> dict:
+        color = ROLE_COLORS.get(role, arcade.color.WHITE)
+        return dict(
+            font_name=self.font_name,
+            font_size=self.font_size,
+            color=arcade.get_four_byte_color(color),
+        )
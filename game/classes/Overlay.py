@@ -0,0 +1,49 @@
+import arcade
+import chess
+
+from typing import Callable, List
+
+from arcade import NamedPoint
+
+
+class Overlay:
+    """A shape and a text sprite for every square, built once and shown by alpha."""
+
+    def __init__(
+        self, shapes: List[arcade.Sprite], texts: List[arcade.Sprite], alpha: int = 255
+    ):
+        self.shapes = shapes
+        self.texts = texts
+        self.alpha = alpha  ## Alpha of a visible shape.
+        self.squares = chess.SquareSet()
+
+        self.sprites = arcade.SpriteList(capacity=len(shapes) * 2)
+        for shape, text in zip(shapes, texts):
+            shape.alpha = text.alpha = 0
+            self.sprites.append(shape)
+            self.sprites.append(text)
+
+    def show(
+        self,
+        squares: chess.SquareSet,
+        center_of: Callable[[chess.Square], NamedPoint],
+        text: arcade.Texture = None,
+        text_alpha: int = 255,
+    ) -> None:
+        """Shows the overlay on the given squares only, optionally with new text."""
+        for square in self.squares:
+            self.shapes[square].alpha = self.texts[square].alpha = 0
+
+        for square in squares:
+            shape, label = self.shapes[square], self.texts[square]
+            shape.position = label.position = center_of(square)
+            shape.alpha = self.alpha
+            if text is not None:
+                label.texture = text
+            label.alpha = text_alpha
+
+        self.squares = squares
+
+    def draw(self) -> None:
+        if self.squares:
+            self.sprites.draw()
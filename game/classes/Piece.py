@@ -2,9 +2,8 @@ import arcade
 import chess
 import chess.pgn
 
-from pathlib import Path
-
 from classes.RotatingSprite import RotatingSprite
+from classes.TextureRegistry import TEXTURES
 
 
 class Piece(RotatingSprite):
@@ -17,10 +16,20 @@ class Piece(RotatingSprite):
     ):
         self.piece = piece
         self.square = square
-        self.file_path = Path(
-            f"assets/{self.piece.symbol().lower()}{chess.COLOR_NAMES[self.piece.color].lower()}.png"
-        )
-        super().__init__(str(self.file_path), center, offset)
+        super().__init__(None, center, offset, texture=TEXTURES.piece(piece))
+
+    def set_piece(self, piece: chess.Piece) -> None:
+        """Shows a different piece, e.g. after a promotion."""
+        self.piece = piece
+        self.texture = TEXTURES.piece(piece)
+
+    def place(
+        self, square: chess.Square, offset: arcade.NamedPoint, angle_rad: float = 0
+    ) -> None:
+        """Moves the sprite to another square."""
+        self.square = square
+        self.offset = offset
+        self.rotate(angle_rad)
 
     # def _get_texture(self) -> arcade.Texture:
     #     if self.file_path.exists() is False:
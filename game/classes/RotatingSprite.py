@@ -1,6 +1,8 @@
 import arcade
 import math
 
+from typing import Iterable
+
 
 class RotatingSprite(arcade.Sprite):
     def __init__(
@@ -9,21 +11,29 @@ class RotatingSprite(arcade.Sprite):
         center: arcade.NamedPoint,
         offset: arcade.NamedPoint,
         scale: float = 1,
+        texture: arcade.Texture = None,
     ):
-        super().__init__(filename, scale)
+        super().__init__(filename, scale, texture=texture)
         self.position = (center.x + offset.x, center.y + offset.y)
         self.center = center
         self.offset = offset
 
     def rotate(self, angle_rad) -> None:
-        rotated = self._rotate_point(self.offset, angle_rad)
-        self.position = (self.center.x + rotated.x, self.center.y + rotated.y)
+        rotate_all((self,), angle_rad)
+
+
+def rotate_all(sprites: Iterable[RotatingSprite], angle_rad: float) -> None:
+    """Rotates many sprites about their centers, with one cos/sin for all of them.
 
-    def _rotate_point(
-        self, offset: arcade.NamedPoint, angle_rad: float
-    ) -> arcade.NamedPoint:
-        cos_angle = math.cos(angle_rad)
-        sin_angle = math.sin(angle_rad)
-        new_x = offset.x * cos_angle - offset.y * sin_angle
-        new_y = offset.x * sin_angle + offset.y * cos_angle
-        return arcade.NamedPoint(new_x, new_y)
+    This stays a plain loop: there are at most 32 pieces, and every new
+    position has to be assigned through `Sprite.position` anyway (which updates
+    the sprite lists' buffers), so vectorizing the math would save nothing.
+    """
+    cos_angle = math.cos(angle_rad)
+    sin_angle = math.sin(angle_rad)
+    for sprite in sprites:
+        x, y = sprite.offset
+        sprite.position = (
+            sprite.center.x + x * cos_angle - y * sin_angle,
+            sprite.center.y + x * sin_angle + y * cos_angle,
+        )
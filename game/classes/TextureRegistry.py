@@ -0,0 +1,56 @@
+import arcade
+import chess
+
+from typing import Dict
+
+BOARD_PATH = "assets/board.jpg"
+
+## Big enough for the board (1300px) and a row of 12 pieces (100px).
+ATLAS_SIZE = (2048, 2048)
+
+
+class TextureRegistry:
+    """The piece and board textures, loaded once into an atlas shared by all sprites."""
+
+    def __init__(self):
+        self.pieces: Dict[chess.Piece, arcade.Texture] = {}
+        self._board: arcade.Texture = None
+        self.atlas: arcade.TextureAtlas = None
+
+    def load(self) -> None:
+        """Decodes every texture. Needs an open window, for the atlas."""
+        if self.atlas is not None:
+            return
+
+        for color in chess.COLORS:
+            for piece_type in chess.PIECE_TYPES:
+                piece = chess.Piece(piece_type, color)
+                self.pieces[piece] = arcade.load_texture(piece_path(piece))
+        self._board = arcade.load_texture(BOARD_PATH)
+
+        self.atlas = arcade.TextureAtlas(
+            ATLAS_SIZE, textures=[self._board, *self.pieces.values()]
+        )
+
+    @property
+    def board(self) -> arcade.Texture:
+        """The shared texture of the board background."""
+        self.load()
+        return self._board
+
+    def piece(self, piece: chess.Piece) -> arcade.Texture:
+        """The shared texture of a piece."""
+        self.load()
+        return self.pieces[piece]
+
+    def sprite_list(self, **kwargs) -> arcade.SpriteList:
+        """A sprite list that draws from the shared atlas."""
+        self.load()
+        return arcade.SpriteList(atlas=self.atlas, **kwargs)
+
+
+def piece_path(piece: chess.Piece) -> str:
+    return f"assets/{piece.symbol().lower()}{chess.COLOR_NAMES[piece.color]}.png"
+
+
+TEXTURES = TextureRegistry()
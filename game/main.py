@@ -3,12 +3,15 @@ import arcade
 import arcade.gui
 import chess
 import logging
+import pyglet
 
 from typing import List
 
 from classes.Board import Board
+from classes.ChatLog import ChatLog, ROLE_ASSISTANT, ROLE_SYSTEM, ROLE_USER
 from classes.Piece import Piece
-from classes.ChatGptApi import ApiMove, ApiError, ApiGameCreated, ChatGptApi
+from classes.TextureRegistry import TEXTURES
+from classes.ChatGptApi import ApiEvent, ApiMove, ApiError, ApiGameCreated, ChatGptApi
 from classes.EventSource import EventSource
 
 LOG = logging.getLogger(__name__)
@@ -48,6 +51,14 @@ CHAT_WIDTH = SCREEN_GRID_WIDTH * 18
 CHAT_BOX_HEIGHT = SCREEN_GRID_HEIGHT * 3
 CHAT_BUTTON_WIDTH = SCREEN_GRID_WIDTH * 3
 
+# Seconds per frame while something changes, and while idle
+ACTIVE_RATE = 1 / 60
+IDLE_RATE = 1
+IDLE_AFTER = 2  ## seconds without input, API events or animation
+
+# Events that don't wake an idle window
+PASSIVE_EVENTS = {"on_draw", "on_refresh", "update", "on_update"}
+
 #####################################################################
 # Game Window
 #####################################################################
@@ -58,6 +69,14 @@ class ChessGame(arcade.Window):
 
     PLAYERS = ["Black", "White"]  # Maps to chess.BLACK and chess.WHITE
 
+    # Seconds since the last input, API event or animation frame.
+    # (Class defaults, since pyglet dispatches events before __init__ ends.)
+    idle_time = 0.0
+    idle = False
+
+    # Latest mouse position not yet handled, if the mouse moved this frame.
+    pointer = None
+
     def __init__(self, width, height, title):
         """Create the variables"""
         super().__init__(width, height, title)
@@ -92,7 +111,7 @@ class ChessGame(arcade.Window):
         h_box.add(self.chat_box)
         h_box.add(self.chat_button)
 
-        self.chat_area = arcade.gui.UITextArea(
+        self.chat_area = ChatLog(
             width=CHAT_WIDTH,
             height=SCREEN_HEIGHT - CHAT_BOX_HEIGHT,
             font_size=12,
@@ -119,6 +138,8 @@ class ChessGame(arcade.Window):
             )
         )
 
+        ## Decode every texture up front, into one atlas.
+        TEXTURES.load()
         self.board: Board = Board(
             arcade.NamedPoint(
                 CHAT_WIDTH + (SCREEN_WIDTH - CHAT_WIDTH) // 2, SCREEN_HEIGHT // 2
@@ -141,21 +162,20 @@ class ChessGame(arcade.Window):
             self.send_chat(message)
             self.chat_box.text = ""
 
-    def append_chat(self, message: str):
+    def append_chat(self, message: str, role: str = ROLE_SYSTEM):
         """Append a chat message"""
         if message == "":
             return
 
         ## Add new messages at the top, so no scrolling is required.
-        ## TODO: Add color to distinguish player messages from API messages.
-        self.chat_area.text = f"{message}\n\n{self.chat_area.text}"
+        self.chat_area.append(role, message)
 
     def send_chat(self, message: str):
         """Send a chat message"""
         if message == "":
             return
         self.api.chat(message)
-        self.append_chat(message)
+        self.append_chat(message, ROLE_USER)
 
     #####################################################################
     # API event handlers
@@ -174,7 +194,7 @@ class ChessGame(arcade.Window):
         """Display greeting from ChatGPT"""
         LOG.info(f"Hello received: {data}")
         try:
-            self.append_chat(data)
+            self.append_chat(data, ROLE_ASSISTANT)
             self.show_message_box(
                 data,
                 ["Sure!", "No thanks."],
@@ -235,18 +255,22 @@ class ChessGame(arcade.Window):
                     self.send_chat(f"Oops, {move} didn't work. {turn}")
             else:
                 # Otherwise, just display the chat message.
-                self.append_chat(data)
+                self.append_chat(data, ROLE_ASSISTANT)
                 self.append_chat(turn)
 
     def on_api_chat(self, data: str):
         """Display with chat message"""
         LOG.info(f"Chat message: {data}")
-        self.append_chat(data)
+        self.append_chat(data, ROLE_ASSISTANT)
 
         move = self.get_move_from_text(data)
         if move is not None:
             self.board.execute_move(move)
 
+    def on_api_event(self, event: ApiEvent):
+        """Pushed game events (our own moves and chats are already handled)"""
+        LOG.debug(f"Event {event.name}: {event.data}")
+
     def get_move_from_text(self, text: str) -> str:
         matches = re.findall(r"(([a-h][1-8]){2}[qbnr]?)", text)
         return matches[0][0] if len(matches) == 1 else None
@@ -277,18 +301,27 @@ class ChessGame(arcade.Window):
         arcade.finish_render()
 
     def on_mouse_motion(self, x: int, y: int, dx: int, dy: int):
-        """Move the piece, if dragging one."""
+        """Remember where the mouse is. It is handled once per frame, in on_update."""
+        self.pointer = (x, y)
+
+    def follow_pointer(self):
+        """Move the piece, if dragging one, or highlight the square under the mouse."""
+        if self.pointer is None:
+            return
+        x, y = self.pointer
+        self.pointer = None
+
         if self.dragging is not None:
             self.dragging.position = (x, y)
-            self.board.show_attackers_of(x, y)
+            self.board.show_attackers_of(x, y, self.dragging)
         else:
             self.board.highlight_square_at(x, y)
 
     def on_mouse_press(self, x: int, y: int, button: int, modifiers: int):
         """Pick up a piece, if available."""
-        pieces: List[Piece] = arcade.get_sprites_at_point((x, y), self.board.pieces)
-        if len(pieces) > 0 and pieces[0].piece.color == self.board.chess_board.turn:
-            self.dragging = pieces[0]
+        piece = self.board.sprite_at(x, y)
+        if piece is not None and piece.piece.color == self.board.chess_board.turn:
+            self.dragging = piece
             # Remove and re-add the piece to the list, so it is drawn last.
             self.board.pieces.remove(self.dragging)
             self.board.pieces.append(self.dragging)
@@ -340,8 +373,24 @@ class ChessGame(arcade.Window):
 
     def on_update(self, delta_time):
         """Movement and game logic"""
+        self.follow_pointer()
         self.board.update(delta_time)
 
+        if self.board.animating or self.dragging is not None:
+            self.wake()
+        else:
+            self.idle_time += delta_time
+            if not self.idle and self.idle_time >= IDLE_AFTER:
+                LOG.debug("Idle, slowing down")
+                self.idle = True
+                self.set_rates(IDLE_RATE)
+
+    def dispatch_event(self, event_type, *args):
+        """Wakes the window on input and API events."""
+        if event_type not in PASSIVE_EVENTS:
+            self.wake()
+        return super().dispatch_event(event_type, *args)
+
     def on_exit(self):
         """Called when user exits the application"""
         LOG.info("Exiting game...")
@@ -350,6 +399,26 @@ class ChessGame(arcade.Window):
     # Utility functions
     #####################################################################
 
+    def wake(self):
+        """Back to full speed after being idle."""
+        self.idle_time = 0.0
+        if self.idle:
+            self.idle = False
+            self.set_rates(ACTIVE_RATE)
+
+    def set_rates(self, rate: float):
+        """Redraws and updates every `rate` seconds."""
+        self.set_update_rate(rate)
+
+        ## pyglet has no public way to change the redraw rate after `run()`,
+        ## so reschedule its redraw callback if this version still has one.
+        ## Otherwise only updates slow down, and frames are drawn as usual.
+        redraw = getattr(pyglet.app.event_loop, "_redraw_windows", None)
+        if redraw is None:
+            return
+        pyglet.clock.unschedule(redraw)
+        pyglet.clock.schedule_interval(redraw, rate)
+
     def show_message_box(
         self,
         message: str,
@@ -379,6 +448,7 @@ ChessGame.register_event_type("on_api_moved")  # Sent after API registers a move
 ChessGame.register_event_type("on_api_suggest")  # Sent when API returns a move
 ChessGame.register_event_type("on_api_chat")  # Sent when API returns a chat
 ChessGame.register_event_type("on_api_error")  # Sent when API returns error
+ChessGame.register_event_type("on_api_event")  # Sent when the server pushes an event
 
 
 def main():
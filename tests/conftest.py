@@ -0,0 +1,75 @@
+import json
+import os
+
+import django
+import pytest
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "chessgpt.settings")
+os.environ.setdefault("SECRET_KEY", "tests")
+django.setup()
+
+import openai
+
+from django.test import Client
+from openai.openai_object import OpenAIObject
+
+
+@pytest.fixture(scope="session", autouse=True)
+def test_database():
+    """A fresh database for the whole run, as `manage.py test` would make."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    name = connection.creation.create_test_db(verbosity=0)
+    yield
+    connection.creation.destroy_test_db(name, verbosity=0)
+    teardown_test_environment()
+
+
+class FakeOpenAI:
+    """Stands in for `openai.ChatCompletion.acreate`.
+
+    Replies (strings, or exceptions to raise) are used in order, and the last
+    one is repeated.
+    """
+
+    def __init__(self):
+        self.replies = ["e2e4"]
+        self.calls = []
+
+    async def acreate(self, **kwargs):
+        self.calls.append(kwargs)
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return OpenAIObject.construct_from(
+            {"choices": [{"message": {"content": reply}}], "usage": {"total_tokens": 10}}
+        )
+
+
+@pytest.fixture
+def fake_openai(monkeypatch) -> FakeOpenAI:
+    fake = FakeOpenAI()
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", fake.acreate)
+    return fake
+
+
+@pytest.fixture
+def client() -> Client:
+    return Client()
+
+
+@pytest.fixture
+def new_game(client):
+    """Creates a game without prefetching a move, and returns its id."""
+
+    def create() -> int:
+        response = client.post(
+            "/api/chess?prefetch=false",
+            data=json.dumps({"white": "Ann", "black": "Bob"}),
+            content_type="application/json",
+        )
+        return response.json()["id"]
+
+    return create
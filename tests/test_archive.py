@@ -0,0 +1,38 @@
+import pytest
+
+from chessgpt.archive import archive_game, game_messages
+from chessgpt.models import ChatHistory, Game, GameArchive, Move
+
+
+def test_archived_game_reads_the_same(client, new_game):
+    game_id = new_game()
+    for move in ("f2f3", "e7e5", "g2g4", "d8h4"):
+        client.post(f"/api/chess/{game_id}/move/{move}?prefetch=false")
+    moves = client.get(f"/api/chess/{game_id}/move").json()
+    history = client.get(f"/api/chat/{game_id}/history").json()
+
+    archive = archive_game(Game.objects.get(id=game_id))
+
+    assert (archive.moves, archive.chats) == (4, len(history))
+    assert not Move.objects.filter(game_id=game_id).exists()
+    assert not ChatHistory.objects.filter(game_id=game_id).exists()
+    assert client.get(f"/api/chess/{game_id}/move").json() == moves
+    assert client.get(f"/api/chat/{game_id}/history").json() == history
+
+
+def test_chat_after_archiving_is_kept_hot():
+    game = Game.objects.create(white="Ann", black="Bob", outcome="1/2-1/2")
+    ChatHistory.objects.create(game=game, role="user", content="Draw?")
+    archive_game(game)
+    ChatHistory.objects.create(game=game, role="assistant", content="Agreed.")
+
+    assert game_messages(game) == [
+        {"role": "user", "content": "Draw?"},
+        {"role": "assistant", "content": "Agreed."},
+    ]
+    assert GameArchive.objects.filter(game=game).count() == 1
+
+
+def test_unfinished_game_is_not_archived(new_game):
+    with pytest.raises(ValueError):
+        archive_game(Game.objects.get(id=new_game()))
@@ -0,0 +1,100 @@
+import asyncio
+import chess
+import json
+
+from chessgpt import batching
+from chessgpt.batching import SuggestBatcher
+
+
+def boards():
+    """The start position (white to move) and the position after 1. e4."""
+    after_e4 = chess.Board()
+    after_e4.push_uci("e2e4")
+    return [chess.Board(), after_e4]
+
+
+def batch_reply(moves: dict) -> str:
+    return "```json\n" + json.dumps(moves) + "\n```"
+
+
+def suggest_all(batcher: SuggestBatcher, boards: list):
+    async def main():
+        return await asyncio.gather(*(batcher.suggest(board, []) for board in boards))
+
+    return asyncio.run(main())
+
+
+def test_batch_reply_is_split_between_games(fake_openai):
+    fake_openai.replies = [batch_reply({"1": "d2d4", "2": "c7c5"})]
+
+    assert suggest_all(SuggestBatcher(size=2), boards()) == ["d2d4", "c7c5"]
+    assert len(fake_openai.calls) == 1
+
+
+def test_illegal_batched_move_is_asked_again(fake_openai):
+    fake_openai.replies = [batch_reply({"1": "d2d4", "2": "a1a8"}), "e7e5"]
+
+    assert suggest_all(SuggestBatcher(size=2), boards()) == ["d2d4", "e7e5"]
+    assert len(fake_openai.calls) == 2
+
+
+def test_cancelled_request_is_left_out_of_the_batch(fake_openai):
+    fake_openai.replies = [batch_reply({"1": "d2d4", "2": "c7c5"})]
+    batcher = SuggestBatcher(size=3)
+
+    async def main():
+        waiting = [asyncio.create_task(batcher.suggest(board, [])) for board in [chess.Board(), *boards()]]
+        await asyncio.sleep(0)  ## All three are queued, and the batch is flushed.
+        waiting[0].cancel()
+        return await asyncio.gather(*waiting, return_exceptions=True)
+
+    cancelled, *moves = asyncio.run(main())
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert moves == ["d2d4", "c7c5"]
+    assert fake_openai.calls[0]["messages"][-1]["content"].count("Position ") == 2
+
+
+def test_failed_batch_never_leaves_callers_waiting(fake_openai, monkeypatch):
+    def broken(board):
+        raise RuntimeError("No evaluator")
+
+    monkeypatch.setattr(batching, "candidates", broken)
+
+    batcher = SuggestBatcher(size=2)
+
+    async def main():
+        waiting = asyncio.gather(*(batcher.suggest(board, []) for board in boards()), return_exceptions=True)
+        return await asyncio.wait_for(waiting, 5)
+
+    assert [str(error) for error in asyncio.run(main())] == ["No evaluator", "No evaluator"]
+
+
+def test_failed_suggestion_reports_its_error(client, new_game, fake_openai):
+    fake_openai.replies = [RuntimeError("OpenAI is down")]
+    game_id = new_game()
+
+    client.post(f"/api/chess/{game_id}/suggestion")
+    response = client.get(f"/api/chess/{game_id}/suggestion?wait=5")
+
+    assert response.status_code == 200
+    assert response.json() == {"ply": 0, "status": "failed", "move": None, "error": "OpenAI is down"}
+
+
+def test_finished_game_gets_the_reply_as_it_is(fake_openai):
+    board = chess.Board()
+    for move in ("f2f3", "e7e5", "g2g4", "d8h4"):
+        board.push_uci(move)
+    assert board.is_checkmate()
+    fake_openai.replies = ["Good game!"]
+
+    assert asyncio.run(batching.suggest_one(board, [])) == "Good game!"
+
+
+def test_suggesting_in_a_finished_game_still_answers(client, new_game, fake_openai):
+    game_id = new_game()
+    for move in ("f2f3", "e7e5", "g2g4", "d8h4"):
+        client.post(f"/api/chess/{game_id}/move/{move}?prefetch=false")
+    fake_openai.replies = ["Good game!"]
+
+    response = client.get(f"/api/chat/{game_id}/suggest")
+    assert (response.status_code, response.json()) == (200, "Good game!")
@@ -0,0 +1,30 @@
+def test_matching_etag_gets_304(client, new_game):
+    game_id = new_game()
+    url = f"/api/chess/{game_id}/move"
+
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first["ETag"]
+
+    cached = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert (cached.status_code, cached.content, cached["ETag"]) == (304, b"", etag)
+
+    client.post(f"/api/chess/{game_id}/move/e2e4?prefetch=false")
+    changed = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert changed.status_code == 200
+    assert changed["ETag"] != etag
+    assert [move["uci"] for move in changed.json()] == ["e2e4"]
+
+
+def test_if_modified_since_alone_never_hides_a_move(client, new_game):
+    game_id = new_game()
+    url = f"/api/chess/{game_id}/move"
+
+    client.post(f"/api/chess/{game_id}/move/e2e4?prefetch=false")
+    first = client.get(url)
+    ## Usually within the same second as the first move.
+    client.post(f"/api/chess/{game_id}/move/e7e5?prefetch=false")
+
+    response = client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+    assert response.status_code == 200
+    assert [move["uci"] for move in response.json()] == ["e2e4", "e7e5"]
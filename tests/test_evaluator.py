@@ -0,0 +1,57 @@
+import chess
+import pytest
+
+from chessgpt import evaluator
+
+
+@pytest.fixture
+def numpy():
+    return pytest.importorskip("numpy")
+
+
+def test_winning_the_queen_ranks_first(numpy):
+    ## White's knight can take the undefended queen on d5.
+    board = chess.Board("4k3/8/8/3q4/8/4N3/8/4K3 w - - 0 1")
+
+    ranked = evaluator.rank_moves(board)
+    assert ranked[0][0] == chess.Move.from_uci("e3d5")
+    assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+    assert len(evaluator.top_moves(board, 3)) == 3
+
+
+def test_mate_ranks_first(numpy):
+    board = chess.Board("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    assert evaluator.rank_moves(board)[0][0] == chess.Move.from_uci("a1a8")
+
+
+def test_finished_game_has_no_moves():
+    board = chess.Board("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3")
+    assert evaluator.rank_moves(board) == []
+    assert evaluator.top_moves(board, 5) == []
+
+
+def test_reply_is_resolved_to_a_legal_move():
+    board = chess.Board()
+    assert evaluator.resolve(board, "I'll play e2e4.") == chess.Move.from_uci("e2e4")
+    assert evaluator.resolve(board, "Nf3, the Reti.") == chess.Move.from_uci("g1f3")
+    assert evaluator.resolve(board, "a1a8") is None
+    assert evaluator.resolve(board, "Good game!") is None
+    assert evaluator.resolve(board, None) is None
+
+
+def test_ambiguous_san_picks_a_matching_piece():
+    ## Both knights can reach d2.
+    board = chess.Board("4k3/8/8/8/8/8/8/1N2KN2 w - - 0 1")
+    assert evaluator.resolve(board, "Nd2") in {
+        chess.Move.from_uci("b1d2"),
+        chess.Move.from_uci("f1d2"),
+    }
+
+
+def test_without_numpy_every_move_is_offered(monkeypatch):
+    monkeypatch.setattr(evaluator, "np", None)
+    board = chess.Board()
+
+    assert not evaluator.available()
+    assert evaluator.top_moves(board, 3) == list(board.legal_moves)
+    assert evaluator.resolve(board, "e4") == chess.Move.from_uci("e2e4")
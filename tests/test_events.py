@@ -0,0 +1,35 @@
+import asyncio
+import json
+
+from chessgpt.events import EventHub, QUEUE_SIZE
+
+
+def read(message: bytes):
+    event, data = message.decode().splitlines()[:2]
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+def test_slow_subscriber_is_resynced_with_a_snapshot(client, new_game):
+    game_id = new_game()
+    client.post(f"/api/chess/{game_id}/move/e2e4?prefetch=false")
+
+    async def main():
+        hub = EventHub()
+        subscription = hub.subscribe(game_id)
+        for n in range(QUEUE_SIZE + 3):
+            hub.publish(game_id, "chat", {"n": n})
+        await asyncio.sleep(0)  ## Let the loop deliver.
+
+        ## The backlog was replaced by one resync, followed by the newer events.
+        assert subscription.queue.qsize() == 3
+
+        stream = hub.stream(subscription)
+        messages = [await stream.__anext__() for _ in range(4)]
+        await stream.aclose()
+        assert hub.subscribers(game_id) == 0
+        return messages
+
+    messages = [read(message) for message in asyncio.run(main())]
+    assert [event for event, _ in messages] == ["snapshot", "snapshot", "chat", "chat"]
+    assert messages[1][1]["moves"] == ["e2e4"]
+    assert [data["n"] for _, data in messages[2:]] == [QUEUE_SIZE + 1, QUEUE_SIZE + 2]
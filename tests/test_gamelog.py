@@ -0,0 +1,78 @@
+import pytest
+
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+
+from chessgpt import gamelog
+from chessgpt.models import Game, GameEvent, Move
+
+AFTER_E4_E5 = "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2"
+
+
+@pytest.fixture
+def event_log():
+    ## A long interval, so only the tests compact the log.
+    with override_settings(GAME_EVENT_LOG=True, GAME_SNAPSHOT_INTERVAL=100):
+        yield
+
+
+def play(client, game_id: int, *moves: str):
+    for move in moves:
+        response = client.post(f"/api/chess/{game_id}/move/{move}?prefetch=false")
+        assert response.status_code == 200, response.json()
+
+
+def test_reads_replay_the_log_over_the_snapshot(client, new_game, event_log):
+    game_id = new_game()
+    play(client, game_id, "e2e4", "e7e5")
+
+    row = Game.objects.get(id=game_id)
+    assert row.version == 0
+    assert GameEvent.objects.filter(game_id=game_id).count() == 2
+    assert not Move.objects.filter(game_id=game_id).exists()
+
+    game = gamelog.get_game(game_id)
+    assert (game.fen, game.version, game.snapshot_version) == (AFTER_E4_E5, 2, 0)
+
+    moves = client.get(f"/api/chess/{game_id}/move").json()
+    assert [(move["id"], move["uci"]) for move in moves] == [(None, "e2e4"), (None, "e7e5")]
+    history = [chat["content"] for chat in client.get(f"/api/chat/{game_id}/history").json()]
+    assert history[-2:] == ["Ann plays e2e4", "Bob plays e7e5"]
+
+
+def test_compact_brings_the_row_up_to_date(client, new_game, event_log):
+    game_id = new_game()
+    play(client, game_id, "e2e4", "e7e5")
+
+    assert async_to_sync(gamelog.compact)(game_id)
+    row = Game.objects.get(id=game_id)
+    assert (row.fen, row.version) == (AFTER_E4_E5, 2)
+
+    assert not async_to_sync(gamelog.compact)(game_id)  ## Nothing left to fold.
+    play(client, game_id, "g1f3")
+    assert gamelog.get_game(game_id).version == 3
+
+
+def test_only_one_move_from_the_same_position_is_logged(new_game, event_log):
+    game_id = new_game()
+    first, second = gamelog.get_game(game_id), gamelog.get_game(game_id)
+    append = async_to_sync(gamelog.append_move)
+
+    fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+    assert append(first, "e2e4", "e4", fen, 0, "") is not None
+    assert append(second, "d2d4", "d4", fen, 0, "") is None
+
+
+def test_turning_the_log_off_keeps_games_playable(client, new_game):
+    game_id = new_game()
+    with override_settings(GAME_EVENT_LOG=True, GAME_SNAPSHOT_INTERVAL=100):
+        play(client, game_id, "e2e4")
+    assert Game.objects.get(id=game_id).version == 0
+
+    with override_settings(GAME_EVENT_LOG=False):
+        play(client, game_id, "e7e5", "g1f3")
+
+    row = Game.objects.get(id=game_id)
+    assert row.version == 3
+    moves = client.get(f"/api/chess/{game_id}/move").json()
+    assert [move["uci"] for move in moves] == ["e2e4", "e7e5", "g1f3"]
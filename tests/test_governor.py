@@ -0,0 +1,57 @@
+import asyncio
+
+import openai
+import pytest
+
+from chessgpt import governor as governor_module
+from chessgpt.governor import Governor, PRIORITY_CHAT, PRIORITY_HELLO, PRIORITY_MOVE
+
+MESSAGES = [{"role": "user", "content": "Your move."}]
+
+
+def test_waiters_are_served_by_priority():
+    governor = Governor(concurrency=1)
+    served = []
+
+    async def wait(priority: int):
+        await governor.acquire(priority, 1)
+        served.append(priority)
+        governor.release(1)
+
+    async def main():
+        await governor.acquire(PRIORITY_CHAT, 1)  ## Hold the only slot.
+        waiters = [
+            asyncio.create_task(wait(priority))
+            for priority in (PRIORITY_HELLO, PRIORITY_CHAT, PRIORITY_MOVE)
+        ]
+        await asyncio.sleep(0.01)
+        governor.release(1)
+        await asyncio.gather(*waiters)
+
+    asyncio.run(main())
+    assert served == [PRIORITY_MOVE, PRIORITY_CHAT, PRIORITY_HELLO]
+
+
+def test_rate_limited_call_is_retried(fake_openai, monkeypatch):
+    monkeypatch.setattr(governor_module, "BACKOFF_BASE", 0.001)
+    fake_openai.replies = [openai.error.RateLimitError("Slow down"), "e2e4"]
+    governor = Governor(max_retries=2)
+
+    completion = asyncio.run(governor.chat_completion(PRIORITY_MOVE, messages=MESSAGES))
+
+    assert completion.choices[0].message.content == "e2e4"
+    assert len(fake_openai.calls) == 2
+    metrics = governor.metrics()
+    assert (metrics["rate_limited"], metrics["retries"], metrics["active"]) == (1, 1, 0)
+
+
+def test_rate_limited_call_gives_up_after_max_retries(fake_openai, monkeypatch):
+    monkeypatch.setattr(governor_module, "BACKOFF_BASE", 0.001)
+    fake_openai.replies = [openai.error.RateLimitError("Slow down")]
+    governor = Governor(max_retries=1)
+
+    with pytest.raises(openai.error.RateLimitError):
+        asyncio.run(governor.chat_completion(PRIORITY_MOVE, messages=MESSAGES))
+
+    assert len(fake_openai.calls) == 2
+    assert governor.metrics()["active"] == 0
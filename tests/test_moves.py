@@ -0,0 +1,14 @@
+from chessgpt.models import Game
+
+
+def test_move_from_a_stale_ply_is_rejected(client, new_game):
+    game_id = new_game()
+
+    assert client.post(f"/api/chess/{game_id}/move/e2e4?ply=0&prefetch=false").status_code == 200
+
+    response = client.post(f"/api/chess/{game_id}/move/e7e5?ply=0&prefetch=false")
+    assert response.status_code == 409
+    assert "Expected ply 0" in response.json()["error"]
+    assert Game.objects.get(id=game_id).version == 1
+
+    assert client.post(f"/api/chess/{game_id}/move/e7e5?ply=1&prefetch=false").status_code == 200
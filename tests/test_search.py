@@ -0,0 +1,21 @@
+from chessgpt.archive import archive_game
+from chessgpt.models import ChatHistory, Game
+from chessgpt.search import search_chat
+
+
+def test_archived_chats_stay_searchable(client):
+    archived = Game.objects.create(white="Ann", black="Bob", outcome="1-0")
+    ChatHistory.objects.create(game=archived, role="user", content="Remember the Evergreen zugzwang?")
+    hot = Game.objects.create(white="Ann", black="Bob")
+    ChatHistory.objects.create(game=hot, role="assistant", content="A zugzwang, again!")
+
+    archive_game(archived)
+    assert not ChatHistory.objects.filter(game=archived).exists()
+
+    results = search_chat("zugzwang")
+    assert {result["game_id"] for result in results} == {archived.id, hot.id}
+    found = next(result for result in results if result["game_id"] == archived.id)
+    assert found["snippet"] == "Remember the Evergreen [zugzwang]?"
+
+    response = client.get("/api/chat/search?q=evergreen")
+    assert [result["game_id"] for result in response.json()["results"]] == [archived.id]
@@ -0,0 +1,43 @@
+import asyncio
+
+from chessgpt.tasks import TaskQueue
+
+
+def test_same_task_is_queued_once():
+    queue = TaskQueue(workers=2)
+    calls = []
+
+    @queue.handler("echo")
+    async def echo(game_id: int, ply: int):
+        calls.append((game_id, ply))
+        await asyncio.sleep(0.05)
+        return f"{game_id}:{ply}"
+
+    first = queue.submit("echo", 1, 0)
+    assert queue.submit("echo", 1, 0) is first
+    other = queue.submit("echo", 1, 1)
+    assert other is not first
+
+    assert first.result(5) == "1:0"
+    assert other.result(5) == "1:1"
+    assert queue.submit("echo", 1, 0) is first  ## Succeeded, so not run again.
+    assert sorted(calls) == [(1, 0), (1, 1)]
+
+
+def test_failed_task_can_be_queued_again():
+    queue = TaskQueue(workers=1)
+    calls = []
+
+    @queue.handler("flaky")
+    async def flaky(game_id: int, ply: int):
+        calls.append(ply)
+        if len(calls) == 1:
+            raise RuntimeError("OpenAI is down")
+        return "e2e4"
+
+    failed = queue.submit("flaky", 1, 0)
+    assert isinstance(failed.exception(5), RuntimeError)
+
+    retried = queue.submit("flaky", 1, 0)
+    assert retried is not failed
+    assert retried.result(5) == "e2e4"
@@ -0,0 +1,46 @@
+import chess
+import json
+
+from chessgpt import timeline
+from chessgpt.models import Move
+
+
+def test_san_moves_are_stored_and_served_as_uci(client, new_game):
+    game_id = new_game()
+    for san in ("e4", "Nf6"):
+        assert client.post(f"/api/chess/{game_id}/move/{san}?prefetch=false").status_code == 200
+
+    stored = list(Move.objects.filter(game_id=game_id).order_by("ply").values_list("uci", "san"))
+    assert stored == [("e2e4", "e4"), ("g8f6", "Nf6")]
+
+    lines = client.get(f"/api/chess/{game_id}/timeline").content.decode().splitlines()
+    assert json.loads(lines[0]) == {"game": game_id, "moves": 2}
+    assert [json.loads(line)[1] for line in lines[1:]] == ["e2e4", "g8f6"]
+
+    response = client.get(f"/api/chess/{game_id}/timeline", HTTP_ACCEPT=timeline.BINARY)
+    assert response.status_code == 200
+    magic, _, count = timeline.HEADER.unpack_from(response.content)
+    assert (magic, count) == (timeline.MAGIC, 2)
+    records = [
+        timeline.RECORD.unpack_from(response.content, timeline.HEADER.size + n * timeline.RECORD.size)
+        for n in range(count)
+    ]
+    assert [record[1] for record in records] == [
+        timeline.pack_move(chess.Move.from_uci("e2e4")),
+        timeline.pack_move(chess.Move.from_uci("g8f6")),
+    ]
+
+
+def test_rows_stored_as_san_are_replayed():
+    board = chess.Board()
+    moves = []
+    for ply, san in enumerate(["e4", "e5", "Nf3"]):
+        board.push_san(san)
+        moves.append({"ply": ply, "uci": san, "san": san, "fen": board.fen()})
+
+    rows = [json.loads(line) for line in timeline.render_ndjson(1, moves).decode().splitlines()[1:]]
+    assert [row[1] for row in rows] == ["e2e4", "e7e5", "g1f3"]
+
+    body = timeline.render_binary(1, moves)
+    last = timeline.RECORD.unpack_from(body, timeline.HEADER.size + 2 * timeline.RECORD.size)
+    assert last[1] == timeline.pack_move(chess.Move.from_uci("g1f3"))